@@ -5,14 +5,22 @@ and injects the answer-injection script **inline** (no external <script src>).
 Inline injection avoids a separate JS request that the game's Chrome/87
 webview would cache independently — making the script persist even after
 the proxy is stopped.
+
+The survey SPA's own hashed static assets are kept in an AssetCache and
+answered from disk in the ``request`` hook on repeat requests.
 """
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
 import re
+import time
 
 from mitmproxy import http
+from mitmproxy.net.http import status_codes
+
+from asset_cache import AssetCache, is_hashed_asset, is_storable
 
 logger = logging.getLogger(__name__)
 
@@ -26,9 +34,35 @@ _NO_CACHE_HEADERS = {
 }
 
 
+_SURVEY_HOST = "survey.hypergryph.com"
+
+
+def _raw_response(status: int, headers: http.Headers, raw: bytes) -> http.Response:
+    """
+    Build a response around already-encoded *raw* bytes.
+    (Response.make() would re-encode according to content-encoding.)
+    """
+    now = time.time()
+    return http.Response(
+        b"HTTP/1.1", status, status_codes.RESPONSES.get(status, "").encode(),
+        headers, raw, None, now, now,
+    )
+
+
 class SurveyAddon:
-    def __init__(self, ws_port: int = 0, log_callback=None) -> None:
+    def __init__(
+        self,
+        ws_port: int = 0,
+        log_callback=None,
+        tag: str = "addon",
+        asset_cache: AssetCache | None = None,
+        server_classify: bool = False,
+    ) -> None:
         self.ws_port = ws_port
+        self.tag = tag  # log prefix; distinguishes listeners sharing one process
+        self.asset_cache = asset_cache  # None disables static asset caching
+        # inject.js asks the WS server to classify pages (page_classifier)
+        self.server_classify = server_classify
         self._log_callback = log_callback
 
         with open(_JS_PATH, "r", encoding="utf-8") as f:
@@ -43,17 +77,105 @@ class SurveyAddon:
         """Return a <script>…</script> block with the full JS inlined."""
         js = self._js_template
         js = js.replace("{{WS_PORT}}", str(self.ws_port))
+        js = js.replace("{{SERVER_CLASSIFY}}", "true" if self.server_classify else "false")
         # Escape </script> inside JS so it doesn't prematurely close the tag
         js = js.replace("</script>", "<\\/script>")
         return (b"<script>" + js.encode("utf-8") + b"</script>")
 
-    def response(self, flow: http.HTTPFlow) -> None:
-        if flow.request.pretty_host != "survey.hypergryph.com":
+    # ── Forwarding fast path: everything that is not the survey site is
+    # streamed straight through instead of being buffered on the flow.
+    # Survey responses are buffered however large they are: the asset cache
+    # needs the whole body and HTML needs it for injection.  That is why
+    # mitmproxy's stream_large_bodies must stay unset: it can switch a flow
+    # to streaming once its body grows past the limit, which no hook here
+    # can undo.
+
+    def requestheaders(self, flow: http.HTTPFlow) -> None:
+        if flow.request.pretty_host != _SURVEY_HOST:
+            flow.request.stream = True
+
+    def responseheaders(self, flow: http.HTTPFlow) -> None:
+        if flow.request.pretty_host != _SURVEY_HOST and flow.response:
+            flow.response.stream = True
+
+    # ── Static asset cache ──
+
+    def _cacheable_request(self, flow: http.HTTPFlow) -> bool:
+        return (
+            self.asset_cache is not None
+            and flow.request.method == "GET"
+            and flow.request.pretty_host == _SURVEY_HOST
+            and is_hashed_asset(flow.request.path)
+        )
+
+    async def request(self, flow: http.HTTPFlow) -> None:
+        if not self._cacheable_request(flow):
+            return
+        assert self.asset_cache is not None
+        url = flow.request.pretty_url
+        entry = self.asset_cache.lookup(url)
+        if entry is None:
+            self.asset_cache.record(hit=False)
+            return
+        headers = http.Headers([(k.encode(), v.encode()) for k, v in entry["headers"]])
+        encoding = headers.get("content-encoding", "")
+        if encoding and encoding not in flow.request.headers.get("accept-encoding", ""):
+            # Stored encoding unusable for this client; go upstream.
+            self.asset_cache.record(hit=False)
+            return
+
+        # Honour the client's validators before touching the disk.
+        etag = headers.get("etag")
+        last_modified = headers.get("last-modified")
+        if (etag and flow.request.headers.get("if-none-match") == etag) or (
+            last_modified
+            and flow.request.headers.get("if-modified-since") == last_modified
+        ):
+            flow.response = _raw_response(304, headers, b"")
+            flow.metadata["zmd_asset_cache"] = "hit"
+            self.asset_cache.record(hit=True)
+            return
+
+        body = await asyncio.to_thread(self.asset_cache.read, entry)
+        if body is None:
+            self.asset_cache.record(hit=False)  # blob vanished; go upstream
+            return
+        headers["content-length"] = str(len(body))
+        flow.response = _raw_response(200, headers, body)
+        flow.metadata["zmd_asset_cache"] = "hit"
+        self.asset_cache.record(hit=True)
+        logger.debug("[%s] asset cache hit %s", self.tag, url)
+
+    async def _maybe_store_asset(self, flow: http.HTTPFlow) -> None:
+        assert flow.response is not None and self.asset_cache is not None
+        if flow.metadata.get("zmd_asset_cache") == "hit":
+            return
+        if flow.response.status_code != 200:
+            return
+        if flow.response.raw_content is None:
+            logger.warning("[%s] asset %s was streamed; not cached",
+                           self.tag, flow.request.pretty_url)
+            return
+        if not is_storable(flow.response.headers.get("cache-control", "")):
+            return
+        await asyncio.to_thread(
+            self.asset_cache.store,
+            flow.request.pretty_url,
+            flow.response.raw_content,
+            dict(flow.response.headers),
+        )
+
+    async def response(self, flow: http.HTTPFlow) -> None:
+        if flow.request.pretty_host != _SURVEY_HOST:
             return
 
         if flow.response is None:
             return
 
+        if self._cacheable_request(flow):
+            await self._maybe_store_asset(flow)
+            return
+
         content_type = flow.response.headers.get("content-type", "")
         if "text/html" not in content_type:
             return
@@ -70,6 +192,8 @@ class SurveyAddon:
 
         body = flow.response.get_content()
         if body is None:
+            logger.warning("[%s] page %s was streamed; not injected",
+                           self.tag, flow.request.pretty_url)
             return
 
         # Remove CSP <meta> tags from HTML as well
@@ -90,4 +214,45 @@ class SurveyAddon:
             body = body + tag
 
         flow.response.set_content(body)
-        self._log(f"[addon] injected inline script into {flow.request.pretty_url}")
+        self._log(f"[{self.tag}] injected inline script into {flow.request.pretty_url}")
+
+
+class ListenerRouter:
+    """
+    Dispatches flows to the SurveyAddon of the listener they arrived on.
+
+    One mitmproxy master can listen on several ports (one ``regular@<port>``
+    mode each); the router keeps one SurveyAddon per port so every listener
+    has its own config while sharing the master, CA and event loop.
+    Listeners can be added / removed at runtime by mutating ``addons``.
+    """
+
+    def __init__(self) -> None:
+        self.addons: dict[int, SurveyAddon] = {}
+
+    def _addon_for(self, flow: http.HTTPFlow) -> SurveyAddon | None:
+        client = flow.client_conn
+        port = client.proxy_mode.custom_listen_port
+        if port is None and client.sockname:
+            port = client.sockname[1]
+        return self.addons.get(port)
+
+    def requestheaders(self, flow: http.HTTPFlow) -> None:
+        addon = self._addon_for(flow)
+        if addon is not None:
+            addon.requestheaders(flow)
+
+    def responseheaders(self, flow: http.HTTPFlow) -> None:
+        addon = self._addon_for(flow)
+        if addon is not None:
+            addon.responseheaders(flow)
+
+    async def request(self, flow: http.HTTPFlow) -> None:
+        addon = self._addon_for(flow)
+        if addon is not None:
+            await addon.request(flow)
+
+    async def response(self, flow: http.HTTPFlow) -> None:
+        addon = self._addon_for(flow)
+        if addon is not None:
+            await addon.response(flow)
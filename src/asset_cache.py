@@ -0,0 +1,205 @@
+"""
+Content-addressed disk cache for immutable survey static assets.
+
+The survey SPA ships its JS/CSS/fonts under hashed filenames
+(``index.3f9a1c2b.js``), so a given URL never changes content.  After the
+game's webview cache is wiped (see cache_cleaner) every one of them would
+be fetched upstream again; SurveyAddon answers repeats from here instead.
+
+Layout under *root*::
+
+    blobs/<sha256[:2]>/<sha256>   raw (still content-encoded) bodies
+    index.json                    url -> digest, size, headers, in LRU order
+
+Blobs are shared between URLs with identical bodies.  The index is kept in
+LRU order and trimmed to *max_bytes*.  All methods are thread-safe; the
+addon calls the disk-touching ones through ``asyncio.to_thread``.
+"""
+from __future__ import annotations
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+_APP_DIR_NAME = "zmd-survey-smasher"
+
+# Hashed build artefacts: name.<hex≥8>.ext or name-<hex≥8>.ext
+_HASHED_ASSET_RE = re.compile(
+    r"[.\-_][0-9a-f]{8,}\.(?:js|mjs|css|woff2?|ttf|otf|eot|png|jpe?g|gif|svg|webp|ico)$",
+    re.IGNORECASE,
+)
+
+# Response headers worth replaying from disk.
+_KEPT_HEADERS = (
+    "content-type",
+    "content-encoding",
+    "cache-control",
+    "etag",
+    "last-modified",
+    "vary",
+    "access-control-allow-origin",
+)
+
+
+def default_cache_dir() -> str:
+    """%LOCALAPPDATA%\\zmd-survey-smasher\\asset-cache, or ~/.cache/… elsewhere."""
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, _APP_DIR_NAME, "asset-cache")
+
+
+def is_hashed_asset(path: str) -> bool:
+    """True if the URL path looks like an immutable, content-hashed asset."""
+    return bool(_HASHED_ASSET_RE.search(path.split("?", 1)[0]))
+
+
+def is_storable(cache_control: str) -> bool:
+    """Honour upstream Cache-Control directives that forbid reuse."""
+    cc = cache_control.lower()
+    return not any(d in cc for d in ("no-store", "no-cache", "private"))
+
+
+class AssetCache:
+    def __init__(self, root: str | None = None, max_bytes: int = 256 * 2**20) -> None:
+        self.root = root or default_cache_dir()
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # url -> {"digest", "size", "headers": [[k, v], ...]}; oldest first
+        self._index: collections.OrderedDict[str, dict] = collections.OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.bytes_served = 0
+        os.makedirs(os.path.join(self.root, "blobs"), exist_ok=True)
+        self._load_index()
+
+    # ------------------------------------------------------------------
+    # Index persistence
+    # ------------------------------------------------------------------
+
+    def _index_path(self) -> str:
+        return os.path.join(self.root, "index.json")
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "blobs", digest[:2], digest)
+
+    def _load_index(self) -> None:
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as exc:
+            logger.warning("Asset cache index unreadable, starting empty: %s", exc)
+            return
+        for url, entry in entries:
+            if os.path.exists(self._blob_path(entry["digest"])):
+                self._index[url] = entry
+                self._size += entry["size"]
+
+    def _save_index(self) -> None:
+        tmp = self._index_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(list(self._index.items()), f, ensure_ascii=False)
+        os.replace(tmp, self._index_path())
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def lookup(self, url: str) -> dict | None:
+        """
+        Return the index entry for *url* (marking it recently used), or None.
+        Does not count towards the hit rate — the caller may still be unable
+        to use the entry; it reports the outcome with ``record``.
+        """
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is not None:
+                self._index.move_to_end(url)
+            return entry
+
+    def record(self, hit: bool) -> None:
+        """Count one request as answered from the cache (*hit*) or not."""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def read(self, entry: dict) -> bytes | None:
+        """Load a blob from disk; None if it vanished (entry is dropped)."""
+        try:
+            with open(self._blob_path(entry["digest"]), "rb") as f:
+                body = f.read()
+        except OSError:
+            with self._lock:
+                for url, e in list(self._index.items()):
+                    if e is entry:
+                        self._drop(url)
+            return None
+        with self._lock:
+            self.bytes_served += len(body)
+        return body
+
+    def store(self, url: str, body: bytes, headers: dict[str, str]) -> None:
+        """Write *body* for *url* and evict least-recently-used entries."""
+        if len(body) > self.max_bytes:
+            return
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(body)
+            os.replace(tmp, path)
+        kept = [[k, v] for k, v in headers.items() if k.lower() in _KEPT_HEADERS]
+        with self._lock:
+            if url in self._index:
+                self._drop(url)
+            self._index[url] = {"digest": digest, "size": len(body), "headers": kept}
+            self._size += len(body)
+            self.stores += 1
+            while self._size > self.max_bytes and self._index:
+                self._drop(next(iter(self._index)))
+                self.evictions += 1
+            self._save_index()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "bytes_served": self.bytes_served,
+            }
+
+    # ------------------------------------------------------------------
+    # Internals (caller holds the lock)
+    # ------------------------------------------------------------------
+
+    def _drop(self, url: str) -> None:
+        entry = self._index.pop(url)
+        self._size -= entry["size"]
+        digest = entry["digest"]
+        if any(e["digest"] == digest for e in self._index.values()):
+            return  # blob still shared by another URL
+        try:
+            os.remove(self._blob_path(digest))
+        except OSError:
+            pass
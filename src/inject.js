@@ -5,6 +5,9 @@
   'use strict';
 
   var WS_PORT = {{WS_PORT}};
+  // Server-classify mode: page detection runs in Python on an HTML snapshot
+  // (see requestPlan); local detection stays as the fallback.
+  var SERVER_CLASSIFY = {{SERVER_CLASSIFY}};
   var ADVANCE_TEXTS = ['下一页'];
   var SKIP_BUTTON_TEXTS = ['下一页', '提交', '上一页'];
   var dialogDismissed = false;
@@ -14,6 +17,19 @@
 
   var _ws = null;
   var _wsQueue = [];
+  var _planWaiters = {};   // classify request id -> callback(plan)
+
+  // Per-tab session id, sent in the handshake URL so the server keeps one
+  // session across reconnects and page reloads of this tab.
+  var SESSION_ID = (function () {
+    var sid = '';
+    try { sid = sessionStorage.getItem('zmd-sid') || ''; } catch (e) {}
+    if (!sid) {
+      sid = Date.now().toString(36) + Math.random().toString(36).slice(2, 10);
+      try { sessionStorage.setItem('zmd-sid', sid); } catch (e) {}
+    }
+    return sid;
+  })();
 
   function _sendWS(obj) {
     if (!WS_PORT) return;
@@ -26,12 +42,21 @@
   function _connectWS() {
     if (!WS_PORT) return;
     try {
-      var ws = new WebSocket('ws://127.0.0.1:' + WS_PORT);
+      var ws = new WebSocket('ws://127.0.0.1:' + WS_PORT + '/?sid=' + encodeURIComponent(SESSION_ID));
       ws.onopen = function () {
         _ws = ws;
         var q = _wsQueue.splice(0);
         q.forEach(function (m) { try { ws.send(m); } catch(e) {} });
       };
+      ws.onmessage = function (ev) {
+        var msg;
+        try { msg = JSON.parse(ev.data); } catch (e) { return; }
+        if (msg && msg.type === 'plan' && _planWaiters[msg.id]) {
+          var waiter = _planWaiters[msg.id];
+          delete _planWaiters[msg.id];
+          waiter(msg);
+        }
+      };
       ws.onclose = function () { if (_ws === ws) _ws = null; setTimeout(_connectWS, 3000); };
       ws.onerror = function () {};
     } catch(e) { setTimeout(_connectWS, 5000); }
@@ -392,9 +417,170 @@
     return null;
   }
 
+  // ─── Server-side classification ───────────────────────────────────────────
+  // One walk over the DOM serializes body into compact HTML (no attributes
+  // except input type/name/checked, no whitespace-only text, no scripts /
+  // styles / our overlay); page_classifier.py mirrors the detection above on
+  // it and returns a plan of element paths.  A path is a list of child
+  // indices counted over _snapKids, which both sides filter the same way.
+  // The same walk builds a structure key — the tags, input state and text
+  // flags page_classifier's structure_hash covers — so the server can answer
+  // a layout it has seen without parsing the snapshot.
+
+  var PLAN_TIMEOUT_MS = 400;
+  var SNAP_TEXT_MAX = 600;
+  var _SNAP_SKIP = { SCRIPT: 1, STYLE: 1, NOSCRIPT: 1, TEMPLATE: 1, LINK: 1, META: 1 };
+  var _SNAP_VOID = { AREA: 1, BASE: 1, BR: 1, COL: 1, EMBED: 1, HR: 1, IMG: 1,
+                     INPUT: 1, SOURCE: 1, TRACK: 1, WBR: 1 };
+  var _planSeq = 0;
+
+  function _snapSkip(el) {
+    return !!_SNAP_SKIP[el.tagName.toUpperCase()]
+      || el.id === 'zmd-log' || el.id === 'zmd-badge' || el.id === 'zmd-toggle';
+  }
+
+  function _snapKids(el) {
+    var out = [];
+    for (var i = 0; i < el.children.length; i++) {
+      if (!_snapSkip(el.children[i])) out.push(el.children[i]);
+    }
+    return out;
+  }
+
+  var _STATUS_TEXTS = ['您尚未答完此题', '请同意以上内容后继续'];
+
+  // Text flags of one element, as in page_classifier.structure_hash.
+  function _textFlags(t) {
+    return (t ? 1 : 0)
+      | (t.length >= 500 ? 2 : 0)
+      | (SKIP_BUTTON_TEXTS.indexOf(t) !== -1 ? 4 : 0)
+      | (isNavText(t) ? 8 : 0)
+      | (t.indexOf('我已阅读，并同意以上内容') !== -1 ? 16 : 0)
+      | (_STATUS_TEXTS.some(function (s) { return t.indexOf(s) !== -1; }) ? 32 : 0);
+  }
+
+  // 53-bit string hash (cyrb53) as hex.
+  function _hash53(str) {
+    var h1 = 0xdeadbeef, h2 = 0x41c6ce57;
+    for (var i = 0; i < str.length; i++) {
+      var ch = str.charCodeAt(i);
+      h1 = Math.imul(h1 ^ ch, 2654435761);
+      h2 = Math.imul(h2 ^ ch, 1597334677);
+    }
+    h1 = Math.imul(h1 ^ (h1 >>> 16), 2246822507) ^ Math.imul(h2 ^ (h2 >>> 13), 3266489909);
+    h2 = Math.imul(h2 ^ (h2 >>> 16), 2246822507) ^ Math.imul(h1 ^ (h1 >>> 13), 3266489909);
+    return (4294967296 * (2097151 & h2) + (h1 >>> 0)).toString(16);
+  }
+
+  function _esc(s) {
+    return s.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;').replace(/"/g, '&quot;');
+  }
+
+  // Serialize el into out.  With key ({toks: [], names: {}, n: 0}) also
+  // append its structure tokens.  Returns el's text as the snapshot has it.
+  function _snapshot(el, out, key) {
+    var tag = el.tagName.toLowerCase();
+    if (tag === 'input') {
+      out.push('<input type="' + _esc(el.type) + '"'
+        + (el.name ? ' name="' + _esc(el.name) + '"' : '')
+        + (el.checked ? ' checked' : '') + '>');
+      if (key) {
+        // Names by order of appearance: the wording of a name never matters.
+        var nm = '-';
+        if (el.name) {
+          if (!(el.name in key.names)) key.names[el.name] = key.n++;
+          nm = key.names[el.name];
+        }
+        key.toks.push('input:' + el.type + ':' + nm + ':' + (el.checked ? 1 : 0) + ';');
+      }
+      return '';
+    }
+    out.push('<' + tag + '>');
+    var at = key ? key.toks.push('') - 1 : -1;  // filled in once the text is known
+    var text = '';
+    if (_SNAP_VOID[tag.toUpperCase()]) {
+      if (key) key.toks[at] = tag + ';';
+      return '';
+    }
+    if (tag === 'svg') {
+      // Icons: keep the text (it counts towards textContent), drop the shapes.
+      var st = (el.textContent || '').trim();
+      if (st) {
+        text = st.slice(0, SNAP_TEXT_MAX);
+        out.push(_esc(text));
+      }
+    } else {
+      for (var i = 0; i < el.childNodes.length; i++) {
+        var n = el.childNodes[i];
+        if (n.nodeType === 3) {
+          if (n.data.trim()) {
+            var d = n.data.slice(0, SNAP_TEXT_MAX);
+            out.push(_esc(d));
+            text += d;
+          }
+        } else if (n.nodeType === 1 && !_snapSkip(n)) {
+          text += _snapshot(n, out, key);
+        }
+      }
+    }
+    out.push('</' + tag + '>');
+    if (key) {
+      key.toks[at] = tag + ':' + _textFlags(text.trim()) + '(';
+      key.toks.push(')');
+    }
+    return text;
+  }
+
+  // Ask the WS server for a plan; cb(plan) or cb(null) on error / timeout.
+  function requestPlan(cb) {
+    var id = ++_planSeq;
+    var t0 = performance.now();
+    var out = [];
+    var key = { toks: [], names: {}, n: 0 };
+    _snapshot(document.body, out, key);
+    var skey = _hash53(key.toks.join(''));
+    var snapMs = Math.round((performance.now() - t0) * 10) / 10;
+    var timer = setTimeout(function () {
+      if (!_planWaiters[id]) return;
+      delete _planWaiters[id];
+      L('\u26a0 plan timeout \u2014 local detection');
+      cb(null);
+    }, PLAN_TIMEOUT_MS);
+    _planWaiters[id] = function (plan) {
+      clearTimeout(timer);
+      if (plan.error) { L('\u26a0 plan error: ' + plan.error + ' \u2014 local detection'); cb(null); return; }
+      cb(plan);
+    };
+    _sendWS({ type: 'classify', id: id, url: location.href, page_key: pageKey(),
+              html: out.join(''), structure_key: skey, snapshot_ms: snapMs });
+  }
+
+  function _resolvePath(path) {
+    var el = document.body;
+    for (var i = 0; i < path.length && el; i++) el = _snapKids(el)[path[i]];
+    return el || null;
+  }
+
+  // Plan groups -> element arrays (carrying the planned pick), or null if
+  // any path no longer resolves (DOM changed since the snapshot).
+  function planGroups(plan) {
+    var groups = [];
+    for (var g = 0; g < plan.groups.length; g++) {
+      var els = [];
+      for (var p = 0; p < plan.groups[g].paths.length; p++) {
+        var el = _resolvePath(plan.groups[g].paths[p]);
+        if (!el) return null;
+        els.push(el);
+      }
+      els.pick = plan.groups[g].pick;
+      groups.push(els);
+    }
+    return groups;
+  }
+
   // ─── Debug report (sent to WS server for analysis) ───────────────────────
 
-  function _sendDebug(pageType) {
+  function _sendDebug(pageType, detectMs) {
     if (!WS_PORT) return;
     var btnGrps = getButtonGroups();
     var divGrps = getDivOptionContainers();
@@ -404,7 +590,9 @@
     _sendWS({
       type: 'debug',
       url: location.href,
+      page_key: pageKey(),
       page_type: pageType || null,
+      detect_ms: detectMs,
       btns: allBtns,
       btn_groups: btnGrps.map(function (g) {
         return g.map(function (el) { return el.textContent.trim().slice(0, 50); });
@@ -458,6 +646,10 @@
 
   function isOptionSelected(el) { return !!_selReason(el); }
 
+  // Which option of a group to answer with — second-to-last, matching
+  // AnswerStrategy's rule.  Shared by the main pass and the fallback.
+  function pickIndex(els) { return Math.max(0, els.length - 2); }
+
   // Smart click: if el contains a radio/checkbox (or IS one), click that input
   // (via its label when possible) and fire a change event.  Falls back to a
   // synthetic mousedown+mouseup+click for button/div elements — needed for
@@ -550,8 +742,8 @@
   // Stagger option-group clicks 150 ms apart so the framework (React/Vue)
   // has time to update state after each click before the next fires.
   // Calls onDone() after the advance button click + a settle delay.
-  function clickOptionGroups(onDone) {
-    var groups = getOptionGroups();
+  // groups come from getOptionGroups() or a server plan (planGroups).
+  function clickOptionGroups(groups, onDone) {
     L('action: option_groups, ' + groups.length + ' groups');
 
     function doGroup(i) {
@@ -600,7 +792,7 @@
         L('  skip [' + selIdx + '/' + els.length + ']: '
           + els[selIdx].textContent.trim().slice(0, 20) + ' via ' + selReason);
       } else {
-        var idx = Math.max(0, els.length - 2);
+        var idx = els.pick !== undefined ? els.pick : pickIndex(els);
         L('  click [' + idx + '/' + els.length + ']: ' + els[idx].textContent.trim().slice(0, 30));
         clickEl(els[idx]);
       }
@@ -609,8 +801,7 @@
     doGroup(0);
   }
 
-  function clickCheckboxGroups(onDone) {
-    var groups = getCheckboxGroups();
+  function clickCheckboxGroups(groups, onDone) {
     L('action: checkbox_groups, ' + groups.length + ' groups');
     groups.forEach(function (cbs) {
       // Check 1–3 random checkboxes per group
@@ -633,8 +824,10 @@
 
   // ─── Fallback (pure setTimeout, no async) ──────────────────────────────
 
-  function hasUnansweredError() {
+  // Visible elements carrying the "您尚未答完此题" marker as direct text.
+  function getUnansweredMarkers() {
     var target = '您尚未答完此题';
+    var markers = [];
     var all = document.body.getElementsByTagName('*');
     for (var i = 0; i < all.length; i++) {
       var el = all[i];
@@ -654,55 +847,86 @@
         var st = window.getComputedStyle(el);
         if (st.display === 'none' || st.visibility === 'hidden' || st.opacity === '0') continue;
       } catch (e) {}
-      return true;
+      markers.push(el);
     }
-    return false;
+    return markers;
+  }
+
+  function hasUnansweredError() {
+    return getUnansweredMarkers().length > 0;
+  }
+
+  // Map each error marker to the option group(s) of its question container:
+  // walk up from the marker until an ancestor contains at least one group.
+  // If no marker maps to a group, fall back to groups with no selection.
+  function getUnansweredGroups(markers) {
+    var candidates = getOptionGroups().concat(getCheckboxGroups());
+    var picked = [];
+    markers.forEach(function (m) {
+      var el = m.parentElement;
+      for (var depth = 0; depth < 10 && el && el !== document.body; depth++) {
+        var inside = candidates.filter(function (g) { return el.contains(g[0]); });
+        if (inside.length) {
+          inside.forEach(function (g) { if (picked.indexOf(g) === -1) picked.push(g); });
+          break;
+        }
+        el = el.parentElement;
+      }
+    });
+    if (picked.length) return picked;
+    return candidates.filter(function (g) {
+      for (var k = 0; k < g.length; k++) { if (_selReason(g[k])) return false; }
+      return true;
+    });
   }
 
-  function handleFallback(attempt, maxRetries, done) {
+  // Answer only the questions flagged as unanswered, using the same choice
+  // as the main pass (pickIndex), then click advance — every round, even
+  // with nothing to answer (intro / notice pages reach here as "unknown"
+  // and only need advancing).  A round counts as resolved once, after its
+  // advance, the page has moved on or the error markers it saw are gone.
+  // Reports attempts-per-page when finished — only for pages that had
+  // flagged questions in some round; a plain advance is not a retry.
+  function handleFallback(attempt, maxRetries, done, flagged) {
     attempt = attempt || 0;
-    maxRetries = maxRetries || 10;
-    if (attempt >= maxRetries) { L('fallback exhausted — waiting for page change'); done(); return; }
-    L('fallback ' + (attempt + 1) + '/' + maxRetries);
-
-    // Try all interactive element types
-    var groups = getOptionGroups();
-    var cbGroups = getCheckboxGroups();
-
-    if (groups.length > 0) {
-      groups.forEach(function (els) {
-        var n = 1 + Math.floor(Math.random() * Math.min(3, els.length));
-        els.slice().sort(function () { return Math.random() - 0.5; }).slice(0, n)
-          .forEach(function (e) { clickEl(e); });
-      });
-    }
-    if (cbGroups.length > 0) {
-      cbGroups.forEach(function (cbs) {
-        var n = 1 + Math.floor(Math.random() * Math.min(3, cbs.length));
-        cbs.slice().sort(function () { return Math.random() - 0.5; }).slice(0, n)
-          .forEach(function (cb) {
-            var label = cb.closest('label');
-            if (label) label.click(); else cb.click();
-            try { cb.dispatchEvent(new Event('change', { bubbles: true })); } catch (e) {}
-          });
-      });
-    }
-    if (groups.length === 0 && cbGroups.length === 0) {
-      // Last resort: click random non-navigation buttons
-      var btns = Array.from(document.querySelectorAll('button')).filter(function (b) {
-        var text = b.textContent.trim();
-        return !text || !isNavText(text);
-      });
-      btns.slice().sort(function () { return Math.random() - 0.5; }).slice(0, 3)
-        .forEach(function (b) { b.click(); });
+    maxRetries = maxRetries || 3;
+    flagged = flagged || 0;
+    function finish(resolved) {
+      if (!flagged) {
+        L('fallback advanced (no flagged questions)');
+        done();
+        return;
+      }
+      L('fallback ' + (resolved ? 'resolved' : 'gave up') + ' after ' + attempt + ' attempt(s)');
+      _sendWS({ type: 'fallback', url: location.href, attempts: attempt, resolved: resolved });
+      done();
     }
+    if (attempt >= maxRetries) { L('fallback exhausted — waiting for page change'); finish(false); return; }
+
+    var key = pageKey();
+    var markers = getUnansweredMarkers();
+    var groups = getUnansweredGroups(markers);
+    flagged += markers.length;
+    L('fallback ' + (attempt + 1) + '/' + maxRetries + ': ' + markers.length + ' marker(s), ' + groups.length + ' group(s)');
+
+    groups.forEach(function (els) {
+      var idx = pickIndex(els);
+      if (_selReason(els[idx])) {
+        L('  fb skip [' + idx + '/' + els.length + ']: already selected');
+        return;
+      }
+      L('  fb click [' + idx + '/' + els.length + ']: ' + (els[idx].textContent || '').trim().slice(0, 30));
+      clickEl(els[idx]);
+    });
+    attempt++;
 
     setTimeout(function () {
       var adv = findAdvanceButton();
       if (adv) adv.click();
       setTimeout(function () {
-        if (!hasUnansweredError()) { done(); return; }
-        handleFallback(attempt + 1, maxRetries, done);
+        var moved = pageKey() !== key;
+        if (moved || (markers.length && !hasUnansweredError())) { finish(true); return; }
+        handleFallback(attempt, maxRetries, done, flagged);
       }, 30);
     }, 30);
   }
@@ -737,24 +961,55 @@
     processing = true;
     var startKey = key;  // captured for afterAction page-change detection
 
+    if (SERVER_CLASSIFY && _ws && _ws.readyState === 1) {
+      requestPlan(function (plan) {
+        if (plan && pageKey() !== startKey) {
+          // Page moved on while the server was classifying — start over.
+          processing = false;
+          processPage();
+          return;
+        }
+        var groups = plan ? planGroups(plan) : null;
+        if (plan && !groups) L('\u26a0 plan paths do not resolve \u2014 local detection');
+        if (!groups) { runPage(startKey, null); return; }
+        L('page: server plan' + (plan.cached ? ' (cached)' : '') + ', ' + groups.length + ' groups');
+        runPage(startKey, { pageType: plan.page_type, groups: groups });
+      });
+      return;
+    }
+    runPage(startKey, null);
+  }
+
+  // In-page detection: logs the element census and reports the result,
+  // with the time it took, in the debug message.
+  function detectLocal() {
+    var t0 = performance.now();
+    var nBtn = document.querySelectorAll('button').length;
+    var nCb = document.querySelectorAll('input[type="checkbox"]').length;
+    var nRd = document.querySelectorAll('input[type="radio"]').length;
+    var nBg = getButtonGroups().length;
+    var nDg = getDivOptionContainers().length;
+    var nRg = getRadioGroups().length;
+    var nCg = getCheckboxGroups().length;
+    var pageType = detectPageType();
+    var detectMs = Math.round((performance.now() - t0) * 10) / 10;
+    L('page: ' + nBtn + ' btns, ' + nCb + ' cb, ' + nRd + ' radio, ' + nBg + ' btnGrp, ' + nDg + ' divGrp, ' + nRg + ' radioGrp, ' + nCg + ' cbGrp');
+    _sendDebug(pageType, detectMs);
+    return pageType;
+  }
+
+  // Act on the page.  plan: {pageType, groups} from the server, or null to
+  // detect in-page.
+  function runPage(startKey, plan) {
     try {
-      var nBtn = document.querySelectorAll('button').length;
-      var nCb = document.querySelectorAll('input[type="checkbox"]').length;
-      var nRd = document.querySelectorAll('input[type="radio"]').length;
-      var nBg = getButtonGroups().length;
-      var nDg = getDivOptionContainers().length;
-      var nRg = getRadioGroups().length;
-      var nCg = getCheckboxGroups().length;
-      L('page: ' + nBtn + ' btns, ' + nCb + ' cb, ' + nRd + ' radio, ' + nBg + ' btnGrp, ' + nDg + ' divGrp, ' + nRg + ' radioGrp, ' + nCg + ' cbGrp');
-
-      var pageType = detectPageType();
-      _sendDebug(pageType);
+      var pageType = plan ? plan.pageType : detectLocal();
+      var groups = plan ? plan.groups : null;
       if (!pageType) {
         // Unknown page — try fallback if there are any interactive elements
-        var hasInteractive = nBtn > 0 || nCb > 0 || nRd > 0;
+        var hasInteractive = !!document.querySelector('button, input[type="checkbox"], input[type="radio"]');
         if (hasInteractive) {
           L('\u26a0 unknown page type \u2014 trying fallback');
-          handleFallback(0, 10, function () { processing = false; processPage(); });
+          handleFallback(0, 3, function () { processing = false; processPage(); });
         } else {
           L('\u26a0 unknown page type (no interactive elements)');
           processing = false;
@@ -768,11 +1023,11 @@
         clickAgreement(afterAction);
         return;
       } else if (pageType === 'checkbox_groups') {
-        clickCheckboxGroups(afterAction);
+        clickCheckboxGroups(groups || getCheckboxGroups(), afterAction);
         return;
       } else if (pageType === 'option_groups') {
         // clickOptionGroups is async (staggered); it calls afterAction when done.
-        clickOptionGroups(afterAction);
+        clickOptionGroups(groups || getOptionGroups(), afterAction);
         return; // skip the synchronous afterAction schedule below
       }
     } catch (e) {
@@ -791,7 +1046,7 @@
       }
       // If an error appeared immediately, fallback without waiting.
       if (hasUnansweredError()) {
-        handleFallback(0, 10, function () { processing = false; processPage(); });
+        handleFallback(0, 3, function () { processing = false; processPage(); });
         return;
       }
       // Quick recheck — page transitions are local / near-instant.
@@ -802,7 +1057,7 @@
           return;
         }
         if (hasUnansweredError()) {
-          handleFallback(0, 10, function () { processing = false; processPage(); });
+          handleFallback(0, 3, function () { processing = false; processPage(); });
         } else {
           L('\u26a0 advance did not change page \u2014 waiting');
           processing = false;
@@ -0,0 +1,30 @@
+"""
+LeanMaster: a mitmproxy Master with only the addons this tool needs.
+
+DumpMaster loads mitmproxy's full default addon set (save, browser,
+script loading, playback, map-local, …) and every one of them receives a
+hook call per flow event.  LeanMaster registers just the proxy core —
+options validation, listeners, protocol detection, TLS interception and
+startup error reporting — and leaves the rest to the caller's addons.
+
+Body streaming is left to those addons: SurveyAddon streams every flow
+that is not the survey site and buffers the survey's own HTML and assets,
+whatever their size, so they can be injected into and cached.
+"""
+from __future__ import annotations
+
+from mitmproxy import master
+from mitmproxy.addons import core, errorcheck, next_layer, proxyserver, tlsconfig
+from mitmproxy.options import Options
+
+
+class LeanMaster(master.Master):
+    def __init__(self, opts: Options, loop=None) -> None:
+        super().__init__(opts, event_loop=loop, with_termlog=False)
+        self.addons.add(
+            core.Core(),
+            proxyserver.Proxyserver(),
+            next_layer.NextLayer(),
+            tlsconfig.TlsConfig(),
+            errorcheck.ErrorCheck(),
+        )
@@ -0,0 +1,205 @@
+"""
+Structured log sink that never blocks the proxy event loop.
+
+Every logger in the process feeds a QueueHandler on the root logger; a
+QueueListener thread does the actual work:
+
+* JSON-lines file (one object per record) with size-based rotation;
+  rotated files are gzip-compressed in the background thread.
+* Optional GUI callback (``MainWindow.log_signal.emit``) for the sources
+  the log window shows.
+
+Per-source levels are applied on the loggers themselves, so filtered-out
+records (e.g. mitmproxy's per-connection INFO chatter) are dropped before
+they are even queued.
+"""
+from __future__ import annotations
+
+import copy
+import datetime
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+
+_APP_DIR_NAME = "zmd-survey-smasher"
+
+# logger name -> minimum level; "" is the root logger.
+DEFAULT_LEVELS: dict[str, int] = {
+    "": logging.INFO,
+    "mitmproxy": logging.WARNING,
+    "websockets": logging.WARNING,
+}
+
+# What the GUI log window shows: our own sources at INFO, everything else
+# only when it is an error.  "main" is excluded — the window already shows
+# its own messages directly.
+GUI_LEVELS: dict[str, int] = {
+    "": logging.ERROR,
+    "ws_server": logging.INFO,
+    "addon": logging.INFO,
+    "proxy_manager": logging.INFO,
+    "main": logging.CRITICAL + 1,
+}
+
+
+def default_log_dir() -> str:
+    """%LOCALAPPDATA%\\zmd-survey-smasher\\logs, or ~/.cache/… elsewhere."""
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, _APP_DIR_NAME, "logs")
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, source, msg (+ exc, extras)."""
+
+    _STD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        doc = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "source": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if record.exc_text:
+            doc["exc"] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in self._STD_ATTRS and not key.startswith("_"):
+                doc[key] = value if isinstance(value, (str, int, float, bool)) else repr(value)
+        return json.dumps(doc, ensure_ascii=False)
+
+
+class SourceLevelFilter(logging.Filter):
+    """
+    Per-source minimum level, matched on the longest dotted-name prefix.
+    ``{"": ERROR, "addon": INFO}`` passes addon INFO and everyone's errors.
+    """
+
+    def __init__(self, levels: dict[str, int]) -> None:
+        super().__init__()
+        self.levels = levels
+        self._cache: dict[str, int] = {}
+
+    def _level_for(self, name: str) -> int:
+        level = self._cache.get(name)
+        if level is None:
+            probe = name
+            while probe not in self.levels and probe:
+                probe = probe.rpartition(".")[0]
+            level = self.levels.get(probe, logging.NOTSET)
+            self._cache[name] = level
+        return level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= self._level_for(record.name)
+
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler whose rotated files are gzip-compressed."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self._gzip_rotate
+
+    @staticmethod
+    def _gzip_rotate(source: str, dest: str) -> None:
+        with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(source)
+
+
+class CallbackHandler(logging.Handler):
+    """Forward the plain message text to a callable (e.g. a Qt signal)."""
+
+    def __init__(self, callback) -> None:
+        super().__init__()
+        self.callback = callback
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.callback(record.getMessage())
+        except Exception:  # noqa: BLE001
+            self.handleError(record)
+
+
+class _StructuredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that keeps the traceback separate from the message
+    (the stock prepare() folds it into ``msg``) so it lands in ``exc``.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class LogSink:
+    def __init__(self, listener: logging.handlers.QueueListener,
+                 queue_handler: logging.Handler, path: str | None) -> None:
+        self._listener = listener
+        self._queue_handler = queue_handler
+        self.path = path
+
+    def stop(self) -> None:
+        """Flush queued records and detach from the root logger."""
+        if self._listener is None:
+            return
+        logging.getLogger().removeHandler(self._queue_handler)
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self._listener = None
+
+
+def start_log_sink(
+    log_dir: str | None = None,
+    gui_callback=None,
+    levels: dict[str, int] | None = None,
+    gui_levels: dict[str, int] | None = None,
+    max_bytes: int = 5 * 2**20,
+    backup_count: int = 5,
+    to_file: bool = True,
+) -> LogSink:
+    """
+    Install the queue-based sink on the root logger and return it.
+    Call ``LogSink.stop()`` on exit to flush the file.
+    """
+    handlers: list[logging.Handler] = []
+    path = None
+    if to_file:
+        log_dir = log_dir or default_log_dir()
+        os.makedirs(log_dir, exist_ok=True)
+        path = os.path.join(log_dir, "zmd-survey-smasher.jsonl")
+        file_handler = CompressingRotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        file_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(file_handler)
+    if gui_callback is not None:
+        gui_handler = CallbackHandler(gui_callback)
+        gui_handler.addFilter(SourceLevelFilter(gui_levels or GUI_LEVELS))
+        handlers.append(gui_handler)
+
+    for name, level in (levels or DEFAULT_LEVELS).items():
+        logging.getLogger(name or None).setLevel(level)
+
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _StructuredQueueHandler(q)
+    listener = logging.handlers.QueueListener(q, *handlers, respect_handler_level=True)
+    logging.getLogger().addHandler(queue_handler)
+    listener.start()
+    return LogSink(listener, queue_handler, path)
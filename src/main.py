@@ -6,6 +6,7 @@ from __future__ import annotations
 import sys
 import os
 import atexit
+import logging
 import signal
 
 # Ensure src/ is on the path when run directly
@@ -15,6 +16,7 @@ from PyQt6.QtCore import pyqtSignal, Qt, QThread, QUrl
 from PyQt6.QtGui import QDesktopServices
 from PyQt6.QtWidgets import (
     QApplication,
+    QCheckBox,
     QGroupBox,
     QHBoxLayout,
     QLabel,
@@ -28,8 +30,13 @@ from PyQt6.QtWidgets import (
 
 from cache_cleaner import clear_game_cache, get_cache_dir
 from cert_installer import install_ca_cert
+from log_sink import start_log_sink
 from proxy_manager import ProxyManager, clear_system_proxy, set_system_proxy
 
+# Explicit name: this module runs as __main__.  log_sink keeps "main" out of
+# the GUI window (it is shown there directly) but persists it to file.
+logger = logging.getLogger("main")
+
 
 class CertInstallThread(QThread):
     finished = pyqtSignal(bool, str)
@@ -52,7 +59,7 @@ class MainWindow(QMainWindow):
         self._running = False
 
         self._build_ui()
-        self.log_signal.connect(self._append_log)
+        self.log_signal.connect(self._show_log)
 
     # ──────────────────────────────────────────────────────────────────
     # UI setup
@@ -93,6 +100,11 @@ class MainWindow(QMainWindow):
         self._proxy_port_spin.setValue(0)
         self._proxy_port_spin.setToolTip("0=自动分配可用端口")
         cfg_layout.addWidget(self._proxy_port_spin)
+        self._server_classify_check = QCheckBox("服务端识别页面")
+        self._server_classify_check.setToolTip(
+            "由本程序解析页面快照识别题目，而不是在游戏浏览器内识别；识别失败时自动回退"
+        )
+        cfg_layout.addWidget(self._server_classify_check)
         cfg_layout.addStretch()
         layout.addWidget(cfg_group)
 
@@ -138,8 +150,10 @@ class MainWindow(QMainWindow):
         from port_utils import find_free_port
 
         port_val = self._proxy_port_spin.value()
+        server_classify = self._server_classify_check.isChecked()
         self._start_btn.setEnabled(False)
         self._proxy_port_spin.setEnabled(False)
+        self._server_classify_check.setEnabled(False)
 
         # ── Auto-clear game cache ──────────────────────────────────────────
         if get_cache_dir() is not None:
@@ -168,11 +182,10 @@ class MainWindow(QMainWindow):
                     except OSError:
                         raise RuntimeError(f"端口 {proxy_port} 已被占用，请换一个端口或设为0自动分配")
 
-            proxy_manager = ProxyManager()
-            proxy_manager.start(
-                proxy_port=proxy_port,
-                log_callback=self.log_signal.emit,
-            )
+            proxy_manager = ProxyManager(server_classify=server_classify)
+            # No log_callback: WS / addon messages reach the log window via
+            # the log sink's GUI handler, off the proxy event loop.
+            proxy_manager.start(proxy_port=proxy_port)
             set_system_proxy(proxy_port)
 
             self._proxy_manager = proxy_manager
@@ -182,11 +195,14 @@ class MainWindow(QMainWindow):
             self._status_label.setStyleSheet("color: green; font-weight: bold;")
             self._stop_btn.setEnabled(True)
 
-            self._append_log(f"Proxy on :{proxy_port}")
+            self._append_log(
+                f"Proxy on :{proxy_port}" + ("（服务端识别页面）" if server_classify else "")
+            )
         except Exception as exc:  # noqa: BLE001
             self._append_log(f"启动失败: {exc}")
             self._start_btn.setEnabled(True)
             self._proxy_port_spin.setEnabled(True)
+            self._server_classify_check.setEnabled(True)
 
     def _on_stop(self) -> None:
         if not self._running:
@@ -213,6 +229,7 @@ class MainWindow(QMainWindow):
         self._start_btn.setEnabled(True)
         self._stop_btn.setEnabled(False)
         self._proxy_port_spin.setEnabled(True)
+        self._server_classify_check.setEnabled(True)
         self._append_log("已停止")
 
     def _on_install_cert(self) -> None:
@@ -231,9 +248,14 @@ class MainWindow(QMainWindow):
         success, message = clear_game_cache()
         self._append_log(("✓ " if success else "✗ ") + message)
 
-    def _append_log(self, text: str) -> None:
+    def _show_log(self, text: str) -> None:
+        # log_signal slot: records from the log sink are already in the file.
         self._log_edit.append(text)
 
+    def _append_log(self, text: str) -> None:
+        self._show_log(text)
+        logger.info(text)
+
     # ──────────────────────────────────────────────────────────────────
     # Close event
     # ──────────────────────────────────────────────────────────────────
@@ -264,10 +286,17 @@ def main() -> None:
 
     app = QApplication(sys.argv)
     window = MainWindow()
+    try:
+        log_sink = start_log_sink(gui_callback=window.log_signal.emit)
+    except OSError as exc:
+        # Unwritable log dir: keep the GUI feed, skip the file.
+        window._append_log(f"⚠ 日志文件不可用: {exc}")
+        log_sink = start_log_sink(gui_callback=window.log_signal.emit, to_file=False)
     window.show()
     try:
         sys.exit(app.exec())
     finally:
+        log_sink.stop()
         # Fallback cleanup
         try:
             clear_system_proxy()
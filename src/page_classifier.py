@@ -0,0 +1,454 @@
+"""
+Server-side page classification from inject.js HTML snapshots.
+
+In server-classify mode inject.js does not run its DOM scans
+(``detectPageType`` and the group finders) in the webview.  It sends one
+compact serialization of ``document.body`` instead, and gets back a click
+plan: the page type plus, per option group, the child-index paths of the
+option elements and the index to pick.
+
+The heuristics below mirror inject.js function for function — keep the
+two in step.  Plans only depend on the page *structure* (tags, input
+type/name/checked and a few text flags), so they are cached by structure:
+every page of a survey that shares a layout is classified once.  inject.js
+sends a key for that structure with each snapshot, so a known layout is
+answered without parsing; ``structure_hash`` is the same key computed
+here, for callers that only have the markup (it saves the heuristics but
+not the parse).
+
+Snapshot format (see ``_snapshot`` in inject.js): plain HTML, no attributes
+except ``type`` / ``name`` / ``checked`` on inputs, whitespace-only text
+dropped, <svg> flattened to its text, and our own overlay elements, scripts
+and styles left out.  Element child indices in a path count only the
+elements that survive that filter, on both sides.
+"""
+from __future__ import annotations
+
+import collections
+import hashlib
+import html.parser
+import threading
+
+AGREEMENT_TEXT = "我已阅读，并同意以上内容"
+SKIP_BUTTON_TEXTS = ("下一页", "提交", "上一页")
+_STATUS_TEXTS = ("您尚未答完此题", "请同意以上内容后继续")
+
+# Elements inject.js leaves out of the snapshot (and the parser drops).
+_SKIPPED_TAGS = frozenset({"script", "style", "noscript", "template", "link", "meta"})
+_VOID_TAGS = frozenset(
+    {"area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+     "meta", "source", "track", "wbr"}
+)
+
+
+class Node:
+    """Minimal element: tag, input state, element children and textContent."""
+
+    __slots__ = ("tag", "type", "name", "checked", "parent", "index",
+                 "kids", "content", "text")
+
+    def __init__(self, tag: str, attrs: dict[str, str | None],
+                 parent: Node | None) -> None:
+        self.tag = tag
+        self.type = (attrs.get("type") or "text").lower() if tag == "input" else ""
+        self.name = attrs.get("name") or ""
+        self.checked = "checked" in attrs
+        self.parent = parent
+        self.index = len(parent.kids) if parent is not None else 0
+        self.kids: list[Node] = []
+        self.content: list[Node | str] = []  # kids and text, in order
+        self.text = ""
+
+    def iter(self):
+        """This node and its descendants in document order."""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.kids))
+
+    def path(self, root: Node) -> list[int]:
+        out = []
+        node = self
+        while node is not root and node is not None:
+            out.append(node.index)
+            node = node.parent
+        return out[::-1]
+
+    def __repr__(self) -> str:
+        return f"<{self.tag} {self.text.strip()[:20]!r}>"
+
+
+class _TreeBuilder(html.parser.HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.root = Node("#root", {}, None)
+        self._stack = [self.root]
+        self._skip = 0  # depth inside a skipped element
+
+    def _open(self, tag: str, attrs, push: bool) -> None:
+        if self._skip:
+            if push and tag not in _VOID_TAGS:
+                self._skip += 1
+            return
+        if tag in _SKIPPED_TAGS:
+            if push and tag not in _VOID_TAGS:
+                self._skip = 1
+            return
+        parent = self._stack[-1]
+        node = Node(tag, dict(attrs), parent)
+        parent.kids.append(node)
+        parent.content.append(node)
+        if push and tag not in _VOID_TAGS:
+            self._stack.append(node)
+
+    def handle_starttag(self, tag, attrs) -> None:
+        self._open(tag, attrs, push=True)
+
+    def handle_startendtag(self, tag, attrs) -> None:
+        self._open(tag, attrs, push=False)
+
+    def handle_endtag(self, tag) -> None:
+        if self._skip:
+            self._skip -= 1
+            return
+        for i in range(len(self._stack) - 1, 0, -1):
+            if self._stack[i].tag == tag:
+                del self._stack[i:]
+                return
+
+    def handle_data(self, data) -> None:
+        if not self._skip and data.strip():
+            self._stack[-1].content.append(data)
+
+
+def _fill_text(root: Node) -> None:
+    """Compute textContent bottom-up (children before parents)."""
+    for node in reversed(list(root.iter())):
+        node.text = "".join(
+            part if isinstance(part, str) else part.text for part in node.content
+        )
+
+
+def parse_snapshot(markup: str) -> Node:
+    """Parse a snapshot (or a whole saved page) and return its <body>."""
+    builder = _TreeBuilder()
+    builder.feed(markup)
+    builder.close()
+    _fill_text(builder.root)
+    for node in builder.root.iter():
+        if node.tag == "body":
+            return node
+    return builder.root
+
+
+def structure_hash(body: Node) -> str:
+    """
+    Hash of everything the heuristics look at: tags, input type / name /
+    checked state, and per-element text flags (empty, long, navigation,
+    agreement and validation texts).  Option wording does not matter.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    names: dict[str, int] = {}
+    stack: list[Node | None] = [body]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            h.update(b")")
+            continue
+        t = node.text.strip()
+        flags = (
+            bool(t)
+            | (len(t) >= 500) << 1
+            | (t in SKIP_BUTTON_TEXTS) << 2
+            | _is_nav_text(t) << 3
+            | (AGREEMENT_TEXT in t) << 4
+            | any(s in t for s in _STATUS_TEXTS) << 5
+        )
+        token = f"{node.tag}:{flags}"
+        if node.tag == "input":
+            name = names.setdefault(node.name, len(names)) if node.name else "-"
+            token += f":{node.type}:{name}:{int(node.checked)}"
+        h.update(token.encode() + b"(")
+        stack.append(None)
+        stack.extend(reversed(node.kids))
+    return h.hexdigest()
+
+
+# ──────────────────────────────────────────────────────────────────────
+# Heuristics (mirrors of inject.js)
+# ──────────────────────────────────────────────────────────────────────
+
+
+def _is_nav_text(text: str) -> bool:
+    return any(t in text for t in SKIP_BUTTON_TEXTS)
+
+
+def _closest(node: Node, tag: str) -> Node | None:
+    while node is not None and node.tag != tag:
+        node = node.parent
+    return node
+
+
+def _count(node: Node, pred) -> int:
+    return sum(1 for d in node.iter() if d is not node and pred(d))
+
+
+def _is_checkbox(node: Node) -> bool:
+    return node.tag == "input" and node.type == "checkbox"
+
+
+def _is_radio(node: Node) -> bool:
+    return node.tag == "input" and node.type == "radio"
+
+
+def pick_index(els: list) -> int:
+    """Second-to-last option — inject.js ``pickIndex``."""
+    return max(0, len(els) - 2)
+
+
+def detect_agreement(body: Node) -> bool:
+    for cb in body.iter():
+        if not _is_checkbox(cb) or cb.checked:
+            continue
+        label = _closest(cb, "label")
+        if label is not None and AGREEMENT_TEXT in label.text:
+            return True
+        el = cb.parent
+        for _ in range(5):
+            if el is None:
+                break
+            if AGREEMENT_TEXT in el.text:
+                return True
+            el = el.parent
+    return False
+
+
+def get_button_groups(body: Node) -> list[list[Node]]:
+    by_parent: dict[Node, list[Node]] = {}
+    for b in body.iter():
+        if b.tag != "button" or b.parent is None:
+            continue
+        text = b.text.strip()
+        if text and _is_nav_text(text):
+            continue
+        by_parent.setdefault(b.parent, []).append(b)
+    return [btns for btns in by_parent.values() if len(btns) >= 2]
+
+
+def get_div_option_containers(body: Node) -> list[list[Node]]:
+    containers = []
+    for el in body.iter():
+        if el.tag != "div":
+            continue
+        kids = el.kids
+        if len(kids) < 2 or len(kids) > 30:
+            continue
+
+        # Phase 0 — mixed direct-button containers
+        direct = [
+            k for k in kids
+            if k.tag == "button"
+            and (not k.text.strip() or k.text.strip() not in SKIP_BUTTON_TEXTS)
+        ]
+        if len(direct) >= 2 and len(direct) >= len(kids) * 0.4:
+            containers.append(direct)
+            continue
+
+        # Phase 1 — wrapped-button containers
+        wrapped = []
+        for k in kids:
+            if k.tag not in ("div", "li", "span"):
+                continue
+            inner = [d for d in k.iter() if d is not k and d.tag == "button"]
+            if len(inner) != 1:
+                continue
+            text = inner[0].text.strip()
+            if text and text in SKIP_BUTTON_TEXTS:
+                continue
+            wrapped.append(inner[0])
+        if len(wrapped) >= 2 and len(wrapped) >= len(kids) * 0.4:
+            containers.append(wrapped)
+            continue
+
+        if len(kids) < 3:
+            continue
+
+        # Phase 2 — strict: every child a div with ≥2 children
+        if len(kids) <= 10 and all(k.tag == "div" and len(k.kids) >= 2 for k in kids):
+            containers.append(list(kids))
+            continue
+
+        # Phase 3 — relaxed: most children are divs with text
+        option_divs = []
+        for k in kids:
+            if k.tag != "div":
+                continue
+            if _count(k, lambda d: d.tag == "button"):
+                continue
+            if _count(k, lambda d: d.tag == "input" and d.type not in ("radio", "checkbox")):
+                continue
+            text = k.text.strip()
+            if 0 < len(text) < 500:
+                option_divs.append(k)
+        if len(option_divs) >= 3 and len(option_divs) >= len(kids) * 0.5:
+            if any(s in k.text for k in option_divs for s in _STATUS_TEXTS):
+                continue
+            if _count(el, lambda d: _is_radio(d) or _is_checkbox(d)):
+                continue
+            containers.append(option_divs)
+    return containers
+
+
+def _near_agreement(cb: Node) -> bool:
+    el = cb
+    for _ in range(6):
+        if el is None:
+            return False
+        if AGREEMENT_TEXT in el.text:
+            return True
+        el = el.parent
+    return False
+
+
+def get_checkbox_groups(body: Node) -> list[list[Node]]:
+    cbs = [cb for cb in body.iter() if _is_checkbox(cb) and not _near_agreement(cb)]
+    if len(cbs) < 2:
+        return []
+
+    by_container: dict[Node, list[Node]] = {}
+    for cb in cbs:
+        container = cb.parent
+        for _ in range(8):
+            if container is None or container is body:
+                break
+            if _count(container, _is_checkbox) >= 2:
+                break
+            container = container.parent
+        if container is None:
+            container = body
+        by_container.setdefault(container, []).append(cb)
+    return [group for group in by_container.values() if len(group) >= 2]
+
+
+def get_radio_groups(body: Node) -> list[list[Node]]:
+    radios = [r for r in body.iter() if _is_radio(r)]
+    if len(radios) < 2:
+        return []
+    by_name: dict[str, list[Node]] = {}
+    for r in radios:
+        by_name.setdefault(r.name or "__noname__", []).append(r)
+    return [group for group in by_name.values() if len(group) >= 2]
+
+
+def get_option_groups(body: Node) -> list[list[Node]]:
+    div_only = [
+        group for group in get_div_option_containers(body)
+        if all(el.tag != "button" for el in group)
+    ]
+    return get_button_groups(body) + div_only + get_radio_groups(body)
+
+
+def classify_tree(body: Node) -> dict:
+    """
+    Return the click plan for a parsed page::
+
+        {"page_type": "agreement" | "option_groups" | "checkbox_groups" | None,
+         "groups": [{"paths": [[child indices…], …], "pick": int}, …]}
+    """
+    groups: list[list[Node]] = []
+    if detect_agreement(body):
+        page_type = "agreement"
+    elif groups := get_option_groups(body):
+        page_type = "option_groups"
+    elif groups := get_checkbox_groups(body):
+        page_type = "checkbox_groups"
+    else:
+        page_type = None
+    return {
+        "page_type": page_type,
+        "groups": [
+            {"paths": [el.path(body) for el in group], "pick": pick_index(group)}
+            for group in groups
+        ],
+    }
+
+
+def resolve(body: Node, path: list[int]) -> Node | None:
+    node = body
+    for i in path:
+        if i >= len(node.kids):
+            return None
+        node = node.kids[i]
+    return node
+
+
+def group_texts(body: Node, plan: dict) -> list[list[str]]:
+    """Option texts of each planned group (for logs / AnswerStrategy)."""
+    out = []
+    for group in plan["groups"]:
+        texts = []
+        for path in group["paths"]:
+            node = resolve(body, path)
+            if node is not None and node.tag == "input":
+                # Bare inputs carry no text; use the label like inject.js logs do.
+                node = _closest(node, "label") or node.parent or node
+            texts.append(node.text.strip()[:50] if node is not None else "?")
+        out.append(texts)
+    return out
+
+
+class PageClassifier:
+    """
+    ``classify_tree`` behind an LRU cache keyed by page structure: the
+    client's structure key when it sends one, else ``structure_hash``.
+    """
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max_entries
+        self._plans: collections.OrderedDict[str, dict] = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, key: str) -> dict | None:
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+            return plan
+
+    def classify(
+        self, markup: str, client_key: str | None = None
+    ) -> tuple[dict, Node | None, bool]:
+        """
+        Return (plan, body, cached) for *markup*.  With *client_key* (the
+        ``structure_key`` inject.js sends) a cached plan is returned without
+        parsing and *body* is None.  Thread-safe; the WS server calls it
+        through ``asyncio.to_thread``.
+        """
+        if client_key:
+            # Namespaced apart from structure_hash keys: different hashes.
+            key = "client:" + client_key
+            plan = self._cached(key)
+            if plan is not None:
+                return plan, None, True
+            body = parse_snapshot(markup)
+        else:
+            body = parse_snapshot(markup)
+            key = structure_hash(body)
+            plan = self._cached(key)
+            if plan is not None:
+                return plan, body, True
+        plan = classify_tree(body)
+        with self._lock:
+            self.misses += 1
+            self._plans[key] = plan
+            while len(self._plans) > self.max_entries:
+                self._plans.popitem(last=False)
+        return plan, body, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._plans), "hits": self.hits, "misses": self.misses}
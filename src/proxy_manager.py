@@ -1,18 +1,28 @@
 """
 ProxyManager: runs mitmproxy in a background asyncio thread.
 Also manages the Windows system proxy via winreg.
+
+A single master can serve several listeners (one per game client /
+account).  Each listener is a ``regular@<port>`` proxy mode with its own
+SurveyAddon config; all of them share the CA / cert cache, the WS server
+and the event loop.  Listeners can be added and removed while running.
 """
 from __future__ import annotations
 
 import asyncio
 import logging
+import sys
 import threading
-import winreg
 
 from mitmproxy.options import Options
 from mitmproxy.tools.dump import DumpMaster
 
-from addon import SurveyAddon
+if sys.platform == "win32":
+    import winreg
+
+from addon import ListenerRouter, SurveyAddon
+from asset_cache import AssetCache
+from lean_master import LeanMaster
 from strategy import AnswerStrategy
 from ws_server import WsServer
 
@@ -20,6 +30,9 @@ logger = logging.getLogger(__name__)
 
 _PROXY_REG_KEY = r"Software\Microsoft\Windows\CurrentVersion\Internet Settings"
 
+# How long add_listener waits for mitmproxy's own startup to finish.
+_STARTUP_TIMEOUT = 5.0
+
 
 def set_system_proxy(port: int = 8080) -> None:
     key = winreg.OpenKey(
@@ -43,13 +56,49 @@ def clear_system_proxy() -> None:
     logger.info("System proxy cleared")
 
 
-class ProxyManager:
+class _StartupWatch:
+    """mitmproxy addon: notes that the master has finished starting up."""
+
     def __init__(self) -> None:
+        self.started = asyncio.Event()
+
+    def running(self) -> None:
+        self.started.set()
+
+
+class ProxyManager:
+    def __init__(
+        self,
+        lean: bool = True,
+        cache_assets: bool = True,
+        cache_dir: str | None = None,
+        extra_addons: list | None = None,
+        mitm_options: dict | None = None,
+        server_classify: bool = False,
+    ) -> None:
+        # lean=False falls back to mitmproxy's DumpMaster (full default
+        # addon set) — kept for comparison benchmarks and troubleshooting.
+        self._lean = lean
+        self._cache_assets = cache_assets
+        self._cache_dir = cache_dir  # None = asset_cache.default_cache_dir()
+        # Extra mitmproxy addons / option overrides, e.g. for test rigs
+        # that redirect upstream connections to a local origin.
+        self._extra_addons = list(extra_addons or [])
+        self._mitm_options = dict(mitm_options or {})
+        # Default for every listener's SurveyAddon: classify pages in
+        # Python from inject.js snapshots instead of in the webview.
+        self._server_classify = server_classify
+        self._asset_cache: AssetCache | None = None
         self._thread: threading.Thread | None = None
         self._loop: asyncio.AbstractEventLoop | None = None
-        self._master: DumpMaster | None = None
+        self._master: LeanMaster | DumpMaster | None = None
         self._ready_event = threading.Event()
         self._proxy_port: int = 8080
+        self._router = ListenerRouter()
+        self._startup: _StartupWatch | None = None
+        self._ws: WsServer | None = None
+        # port -> extra SurveyAddon kwargs for every listener to bring up
+        self._listeners: dict[int, dict] = {}
 
     # ------------------------------------------------------------------
     # Public API
@@ -59,14 +108,17 @@ class ProxyManager:
         self,
         proxy_port: int = 8080,
         log_callback=None,
+        extra_ports: list[int] | tuple[int, ...] = (),
     ) -> None:
         """
-        Start the background asyncio loop with mitmproxy DumpMaster on *proxy_port*.
+        Start the background asyncio loop with the mitmproxy master on *proxy_port*
+        (plus one listener per *extra_ports* entry).
         Blocks until the proxy is ready.
         """
         self._proxy_port = proxy_port
         self._ready_event.clear()
         self._log_callback = log_callback
+        self._listeners = {port: {} for port in (proxy_port, *extra_ports)}
 
         self._thread = threading.Thread(
             target=self._thread_main,
@@ -77,6 +129,33 @@ class ProxyManager:
         self._thread.start()
         self._ready_event.wait()
 
+    @property
+    def listeners(self) -> list[int]:
+        """Ports of all configured listeners."""
+        return list(self._listeners)
+
+    def add_listener(self, port: int, timeout: float = 10, **addon_options) -> bool:
+        """
+        Bring up another listener on *port* in the running master.
+        *addon_options* are passed to that listener's SurveyAddon.
+        Thread-safe; blocks until the port is bound and returns success.
+        """
+        if self._loop is None:
+            raise RuntimeError("ProxyManager is not running")
+        future = asyncio.run_coroutine_threadsafe(
+            self._add_listener(port, addon_options), self._loop
+        )
+        return future.result(timeout)
+
+    def remove_listener(self, port: int, timeout: float = 10) -> bool:
+        """Stop listening on *port*.  Thread-safe; returns success."""
+        if self._loop is None:
+            raise RuntimeError("ProxyManager is not running")
+        future = asyncio.run_coroutine_threadsafe(
+            self._remove_listener(port), self._loop
+        )
+        return future.result(timeout)
+
     def stop(self) -> None:
         if self._loop is None:
             return
@@ -89,6 +168,8 @@ class ProxyManager:
             self._thread.join(timeout=10)
         self._loop = None
         self._master = None
+        self._ws = None
+        self._router.addons.clear()
 
     # ------------------------------------------------------------------
     # Background thread
@@ -118,16 +199,119 @@ class ProxyManager:
                 pass
             loop.close()
 
+    def _make_addon(self, port: int, addon_options: dict) -> SurveyAddon:
+        assert self._ws is not None
+        options = {
+            "tag": f"addon:{port}",
+            "asset_cache": self._asset_cache,
+            "server_classify": self._server_classify,
+            **addon_options,
+        }
+        return SurveyAddon(
+            ws_port=self._ws.port,
+            log_callback=self._log_callback,
+            **options,
+        )
+
+    def _modes(self) -> list[str]:
+        return [f"regular@{port}" for port in self._listeners]
+
+    async def _apply_modes(self) -> bool:
+        assert self._master is not None
+        self._master.options.update(mode=self._modes())
+        proxyserver = self._master.addons.get("proxyserver")
+        # options.update() already queued Proxyserver's own servers.update();
+        # this waits on the same lock, so afterwards every instance has
+        # started or failed — but its return value may be a no-op True.
+        return await proxyserver.setup_servers()
+
+    def _startup_checked(self) -> bool:
+        """
+        Whether mitmproxy's startup error check is over.  Until then any
+        logged error — such as a failed bind for a listener added early —
+        makes ErrorCheck exit the whole process.
+        """
+        assert self._master is not None
+        ec = self._master.addons.get("errorcheck")
+        # ErrorCheck exposes no "done" state; it uninstalls this handler.
+        handler = getattr(ec, "logger", None)
+        return handler is None or handler not in logging.getLogger().handlers
+
+    async def _wait_startup(self) -> bool:
+        """
+        Wait (at most _STARTUP_TIMEOUT) for the master's ``running`` hook and
+        the end of ErrorCheck's startup check, which follows right after it.
+        """
+        assert self._startup is not None
+        try:
+            async with asyncio.timeout(_STARTUP_TIMEOUT):
+                await self._startup.started.wait()
+                while not self._startup_checked():
+                    await asyncio.sleep(0.01)
+        except TimeoutError:
+            return False
+        return True
+
+    def _listener_running(self, port: int) -> bool:
+        """Whether mitmproxy actually bound the listener for *port*."""
+        assert self._master is not None
+        proxyserver = self._master.addons.get("proxyserver")
+        try:
+            return proxyserver.servers[f"regular@{port}"].is_running
+        except KeyError:
+            return False
+
+    async def _add_listener(self, port: int, addon_options: dict) -> bool:
+        if not await self._wait_startup():
+            logger.warning("Listener :%d not added: proxy startup did not finish", port)
+            return False
+        if port in self._listeners:
+            return True
+        self._listeners[port] = addon_options
+        self._router.addons[port] = self._make_addon(port, addon_options)
+        await self._apply_modes()
+        ok = self._listener_running(port)
+        if not ok:
+            # Roll back so a failed bind doesn't linger in the mode list.
+            del self._listeners[port]
+            self._router.addons.pop(port, None)
+            await self._apply_modes()
+        logger.info("Listener :%d %s", port, "added" if ok else "failed to start")
+        return ok
+
+    async def _remove_listener(self, port: int) -> bool:
+        if port not in self._listeners:
+            return False
+        del self._listeners[port]
+        await self._apply_modes()
+        self._router.addons.pop(port, None)
+        ok = not self._listener_running(port)
+        logger.info("Listener :%d %s", port, "removed" if ok else "failed to stop")
+        return ok
+
     async def _async_main(self, proxy_port: int) -> None:
         ws = WsServer(AnswerStrategy(), log_callback=self._log_callback)
         await ws.start()
+        self._ws = ws
 
-        opts = Options(listen_host="127.0.0.1", listen_port=proxy_port)
-        master = DumpMaster(opts, with_termlog=False, with_dumper=False)
-        master.addons.add(SurveyAddon(
-            ws_port=ws.port,
-            log_callback=self._log_callback,
-        ))
+        if self._cache_assets and self._asset_cache is None:
+            try:
+                self._asset_cache = AssetCache(self._cache_dir)
+            except OSError as exc:
+                logger.warning("Asset cache disabled: %s", exc)
+
+        for port, addon_options in self._listeners.items():
+            self._router.addons[port] = self._make_addon(port, addon_options)
+
+        opts = Options(listen_host="127.0.0.1", listen_port=proxy_port, mode=self._modes())
+        if self._lean:
+            master = LeanMaster(opts)
+        else:
+            master = DumpMaster(opts, with_termlog=False, with_dumper=False)
+        self._startup = _StartupWatch()
+        master.addons.add(self._router, self._startup, *self._extra_addons)
+        if self._mitm_options:
+            master.options.update(**self._mitm_options)
         self._master = master
 
         # Signal readiness
@@ -139,3 +323,10 @@ class ProxyManager:
             logger.warning("mitmproxy master exited: %s", exc)
         finally:
             await ws.stop()
+            if self._asset_cache is not None:
+                st = self._asset_cache.stats()
+                logger.info(
+                    "Asset cache: %d hits / %d misses (%.0f%%), %d entries, %.1f MiB",
+                    st["hits"], st["misses"], st["hit_rate"] * 100,
+                    st["entries"], st["bytes"] / 2**20,
+                )
@@ -4,6 +4,8 @@ Swap decide() with an LLM subclass later without touching WS plumbing.
 """
 from __future__ import annotations
 
+import asyncio
+
 
 class AnswerStrategy:
     # ------------------------------------------------------------------
@@ -43,6 +45,16 @@ class AnswerStrategy:
 
         return {"type": "eval", "code": code}
 
+    async def decide_async(self, payload: dict) -> dict:
+        """
+        Awaitable ``decide``; the WS server calls this one and cancels it when
+        a speculated page goes stale.  The default runs ``decide`` in a worker
+        thread, which cancelling cannot stop — only the result is discarded.
+        A subclass doing slow I/O (an LLM request) should override this with
+        a native async implementation so cancellation ends the work.
+        """
+        return await asyncio.to_thread(self.decide, payload)
+
     # ------------------------------------------------------------------
     # JS generator: agreement
     # ------------------------------------------------------------------
@@ -1,75 +1,442 @@
 """
 WebSocket answer server.
 Runs in the same asyncio event loop as mitmproxy.
+
+Answers can be computed speculatively: as soon as a client describes a
+page (the ``debug`` message), ``AnswerStrategy.decide_async`` is started
+and cached per session under the page fingerprint.  The later ``query``
+for the same page then resolves from that cache instead of running the
+(possibly expensive) strategy inline.  Clients that query opt in with
+``speculate=1`` in the handshake URL; inject.js answers pages itself and
+never queries, so it does not, and its page descriptions trigger no
+``decide`` call nobody consumes.
+
+Each webview tab is a *session*: inject.js passes a per-tab id in the
+handshake URL (``ws://127.0.0.1:<port>/?sid=<id>``).  Sessions outlive
+individual connections, so the 3 s reconnect loop and queue replay land
+back on the same page history, counters, rate limit and speculation cache.
+
+In server-classify mode inject.js skips its own page detection and sends a
+``classify`` message with an HTML snapshot instead; the reply is a ``plan``
+computed by page_classifier, cached by the page structure key the client
+sends along, so a known layout is answered without parsing the snapshot.
 """
 from __future__ import annotations
 
 import asyncio
+import collections
+import hashlib
+import itertools
 import json
 import logging
+import time
+import urllib.parse
 
 import websockets
 import websockets.asyncio.server
 
+from page_classifier import PageClassifier, group_texts
 from strategy import AnswerStrategy
 
 logger = logging.getLogger(__name__)
 
 
+def page_fingerprint(payload: dict) -> str:
+    """
+    Return a stable key identifying the page a ``debug``/``query`` payload
+    describes.  Prefers the client-side ``page_key``; falls back to hashing
+    the URL and page type — the only fields every message kind carries
+    (group texts are in ``debug`` and ``classify`` but not in ``query``).
+    """
+    page_key = payload.get("page_key")
+    if page_key:
+        return str(page_key)
+    parts = [payload.get("url", ""), payload.get("page_type") or ""]
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+# Message types the handler knows; anything else is counted as "other".
+_MESSAGE_TYPES = frozenset({"query", "classify", "log", "fallback", "debug"})
+# Requests the client waits on → the type of their reply.
+_REPLY_TYPES = {"query": "eval", "classify": "plan"}
+
+# Payload fields that differ between two descriptions of the same page.
+_VOLATILE_KEYS = frozenset({"type", "id", "detect_ms", "snapshot_ms"})
+
+
+def _payload_digest(payload: dict) -> str:
+    """Hash of everything a page description says about the page."""
+    stable = {k: v for k, v in payload.items() if k not in _VOLATILE_KEYS}
+    raw = json.dumps(stable, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class _Speculation:
+    """Per-session cache of in-flight / finished ``decide_async()`` tasks."""
+
+    def __init__(self) -> None:
+        # page fingerprint -> (digest of the payload it was started from, task)
+        self._tasks: dict[str, tuple[str, asyncio.Task]] = {}
+
+    def start(self, key: str, strategy: AnswerStrategy, payload: dict) -> bool:
+        """
+        Begin computing the answer for *key*.  Any other speculation is
+        cancelled — the page changed, so its answer is stale.  That includes
+        one under the same key started from a different payload (an SPA step
+        can keep its URL and page type).  Returns False if *key* is already
+        being (or has been) computed from this same payload.
+        """
+        digest = _payload_digest(payload)
+        current = self._tasks.get(key)
+        if current is not None and current[0] == digest:
+            return False
+        self.cancel_all()
+        self._tasks[key] = (digest, asyncio.create_task(strategy.decide_async(payload)))
+        return True
+
+    def pop(self, key: str) -> asyncio.Task | None:
+        entry = self._tasks.pop(key, None)
+        return entry[1] if entry is not None else None
+
+    def cancel_all(self) -> None:
+        """Cancel every task (see ``AnswerStrategy.decide_async`` for what stops)."""
+        for _, task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+
+class _TokenBucket:
+    """Simple token bucket: *rate* tokens/s, holding at most *burst*."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+
+class Session:
+    """State kept for one inject.js tab across reconnects."""
+
+    HISTORY_LEN = 50
+
+    def __init__(self, sid: str, rate: float, burst: int) -> None:
+        self.sid = sid
+        self.created = time.monotonic()
+        self.last_seen = self.created
+        self.connections = 0        # currently open sockets
+        self.connects = 0           # total handshakes seen
+        # handled messages per type (unknown types under "other");
+        # rate-limited drops are counted apart
+        self.counters: collections.Counter[str] = collections.Counter()
+        self.dropped = 0
+        # (monotonic time, url, page_type) of every page described by debug
+        self.pages: collections.deque[tuple[float, str, str | None]] = (
+            collections.deque(maxlen=self.HISTORY_LEN)
+        )
+        self.speculate = False      # client opted in with ?speculate=1
+        self.speculation = _Speculation()
+        self._bucket = _TokenBucket(rate, burst)
+        self.rate_limited = False  # True while dropping; logged once per burst
+
+    def admit(self) -> bool:
+        """Account for one inbound message; False if it must be dropped."""
+        self.last_seen = time.monotonic()
+        if self._bucket.take():
+            self.rate_limited = False
+            return True
+        self.dropped += 1
+        return False
+
+    def record_page(self, url: str, page_type: str | None) -> None:
+        if self.pages and self.pages[-1][1:] == (url, page_type):
+            return
+        self.pages.append((time.monotonic(), url, page_type))
+
+    def stats(self) -> dict:
+        return {
+            "sid": self.sid,
+            "connections": self.connections,
+            "connects": self.connects,
+            "pages": len(self.pages),
+            "counters": dict(self.counters),
+            "dropped": self.dropped,
+        }
+
+
 class WsServer:
+    # Per-session inbound message rate limit.  The burst must absorb
+    # inject.js replaying its whole 200-message queue on reconnect.
+    RATE_LIMIT = 50.0
+    RATE_BURST = 250
+    # Disconnected sessions are forgotten after this many seconds.
+    SESSION_TTL = 600.0
+
     def __init__(self, strategy: AnswerStrategy, log_callback=None) -> None:
         self.strategy = strategy
+        self.classifier = PageClassifier()
         self.log_callback = log_callback  # optional callable(str) for GUI log
         self._server: websockets.asyncio.server.Server | None = None
         self.port: int = 0
+        self.sessions: dict[str, Session] = {}
+        self._anon_ids = itertools.count(1)
+        # Fallback rounds per page → number of pages, kept apart for pages
+        # the fallback resolved and pages it gave up on (from inject.js).
+        self.fallback_resolved: dict[int, int] = {}
+        self.fallback_gave_up: dict[int, int] = {}
 
-    def _log(self, msg: str) -> None:
-        logger.info(msg)
+    def _log(self, msg: str, extra: dict | None = None) -> None:
+        logger.info(msg, extra=extra)
         if self.log_callback:
             self.log_callback(msg)
 
+    # ------------------------------------------------------------------
+    # Sessions
+    # ------------------------------------------------------------------
+
+    def _session_for(self, websocket) -> Session:
+        """
+        Look up (or create) the session named by the handshake ``sid`` and
+        apply the handshake's ``speculate`` opt-in.
+        """
+        path = getattr(getattr(websocket, "request", None), "path", "") or ""
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(path).query)
+        sid = (query.get("sid") or [""])[0][:64] or f"anon-{next(self._anon_ids)}"
+        self._prune_sessions()
+        session = self.sessions.get(sid)
+        if session is None:
+            session = Session(sid, self.RATE_LIMIT, self.RATE_BURST)
+            self.sessions[sid] = session
+        session.speculate = (query.get("speculate") or [""])[0] == "1"
+        if not session.speculate:
+            session.speculation.cancel_all()
+        return session
+
+    def _prune_sessions(self) -> None:
+        cutoff = time.monotonic() - self.SESSION_TTL
+        for sid, session in list(self.sessions.items()):
+            if session.connections == 0 and session.last_seen < cutoff:
+                session.speculation.cancel_all()
+                del self.sessions[sid]
+
+    def stats(self) -> dict:
+        """Aggregate counters across all live sessions."""
+        totals: collections.Counter[str] = collections.Counter()
+        for session in self.sessions.values():
+            totals.update(session.counters)
+        return {
+            "sessions": len(self.sessions),
+            "connections": sum(s.connections for s in self.sessions.values()),
+            "counters": dict(totals),
+            "dropped": sum(s.dropped for s in self.sessions.values()),
+            "classifier": self.classifier.stats(),
+        }
+
+    def _note_page(self, session: Session, payload: dict) -> None:
+        """
+        Record a described page and, for sessions that opted in, speculate
+        on its answer.
+        """
+        session.record_page(payload.get("url", ""), payload.get("page_type"))
+        if payload.get("page_type") and session.speculate:
+            session.speculation.start(page_fingerprint(payload), self.strategy, payload)
+        else:
+            session.speculation.cancel_all()
+
+    def _note_fallback(self, payload: dict, tag: str) -> None:
+        """Add one finished fallback page to the attempts histograms."""
+        try:
+            attempts = int(payload.get("attempts", 0))
+        except (TypeError, ValueError):
+            attempts = -1
+        if attempts < 0:
+            self._log(f"{tag} bad fallback attempts: {payload.get('attempts')!r}")
+            return
+        resolved = bool(payload.get("resolved"))
+        hist = self.fallback_resolved if resolved else self.fallback_gave_up
+        hist[attempts] = hist.get(attempts, 0) + 1
+
+        def fmt(h: dict[int, int]) -> str:
+            return ", ".join(f"{k}×{v}" for k, v in sorted(h.items())) or "-"
+
+        self._log(
+            f"[FB] {'resolved' if resolved else 'gave up'} after {attempts} attempt(s)  "
+            f"{payload.get('url', '')}  (attempts/page resolved: "
+            f"{fmt(self.fallback_resolved)}; gave up: {fmt(self.fallback_gave_up)})"
+        )
+
+    async def _answer(self, spec: _Speculation, payload: dict) -> tuple[dict, bool]:
+        """
+        Resolve the answer for a ``query`` payload.
+        Returns (response, hit) where *hit* tells whether a speculation was used.
+        """
+        task = spec.pop(page_fingerprint(payload))
+        if task is not None and not task.cancelled():
+            try:
+                return await task, True
+            except asyncio.CancelledError:
+                pass
+            except Exception as exc:  # noqa: BLE001
+                self._log(f"[WS] speculative decide failed: {exc}")
+        return await self.strategy.decide_async(payload), False
+
+    async def _reject(self, websocket, raw) -> None:
+        """
+        Answer a rate-limited request with an error reply, so the client
+        does not wait out its timeout.  Other dropped messages get nothing.
+        """
+        try:
+            payload = json.loads(raw)
+        except json.JSONDecodeError:
+            return
+        if not isinstance(payload, dict):
+            return
+        msg_type = payload.get("type")
+        reply_type = _REPLY_TYPES.get(msg_type) if isinstance(msg_type, str) else None
+        if reply_type is not None:
+            await websocket.send(json.dumps(
+                {"type": reply_type, "id": payload.get("id"), "error": "rate limited"}
+            ))
+
+    async def _classify(self, websocket, session: Session, payload: dict, tag: str) -> None:
+        """Answer a ``classify`` snapshot with a click ``plan``."""
+        url = payload.get("url", "")
+        t0 = time.perf_counter()
+        try:
+            client_key = payload.get("structure_key")
+            plan, body, cached = await asyncio.to_thread(
+                self.classifier.classify,
+                str(payload.get("html", "")),
+                str(client_key) if client_key else None,
+            )
+        except Exception as exc:  # noqa: BLE001
+            # The client falls back to in-page detection on an error reply.
+            await websocket.send(json.dumps(
+                {"type": "plan", "id": payload.get("id"), "error": str(exc)}
+            ))
+            self._log(f"{tag} classify failed: {exc}")
+            return
+        classify_ms = (time.perf_counter() - t0) * 1000
+        await websocket.send(json.dumps(
+            {"type": "plan", "id": payload.get("id"), "cached": cached, **plan}
+        ))
+
+        # No body on a keyed cache hit: the snapshot was never parsed.
+        texts = group_texts(body, plan) if body is not None else None
+        snapshot_ms = payload.get("snapshot_ms")
+        lines = [
+            f"[CLS] page_type={plan['page_type']!r}  {url}  "
+            f"({'cached' if cached else 'classified'} {classify_ms:.1f} ms, "
+            f"snapshot {len(payload.get('html', ''))} B"
+            + (f" / {snapshot_ms} ms" if snapshot_ms is not None else "") + ")"
+        ]
+        if texts is None:
+            for i, g in enumerate(plan["groups"]):
+                lines.append(f"[CLS]   grp[{i}]: {len(g['paths'])} options, pick {g['pick']}")
+        else:
+            for i, g in enumerate(texts):
+                lines.append(f"[CLS]   grp[{i}]: {g}")
+        self._log("\n".join(lines), extra={
+            "classify_ms": round(classify_ms, 3),
+            "snapshot_ms": snapshot_ms,
+            "cached": cached,
+        })
+        self._note_page(session, {
+            "url": url,
+            "page_key": payload.get("page_key"),
+            "page_type": plan["page_type"],
+            "groups": texts,
+        })
+
     async def _handler(self, websocket) -> None:
-        self._log(f"[WS] client connected: {websocket.remote_address}")
+        session = self._session_for(websocket)
+        session.connections += 1
+        session.connects += 1
+        spec = session.speculation
+        tag = f"[WS:{session.sid[:8]}]"
+        self._log(
+            f"{tag} client connected: {websocket.remote_address}"
+            f" (connect #{session.connects})"
+        )
         try:
             async for raw in websocket:
+                if not session.admit():
+                    if not session.rate_limited:
+                        session.rate_limited = True
+                        self._log(f"{tag} rate limited — dropping messages")
+                    await self._reject(websocket, raw)
+                    continue
                 try:
                     payload = json.loads(raw)
                 except json.JSONDecodeError as exc:
-                    self._log(f"[WS] JSON decode error: {exc}")
+                    self._log(f"{tag} JSON decode error: {exc}")
+                    continue
+                if not isinstance(payload, dict):
+                    self._log(f"{tag} message is not an object: {raw[:80]!r}")
                     continue
 
                 msg_type = payload.get("type")
+                known = isinstance(msg_type, str) and msg_type in _MESSAGE_TYPES
+                session.counters[msg_type if known else "other"] += 1
 
                 if msg_type == "query":
-                    response = self.strategy.decide(payload)
+                    response, hit = await self._answer(spec, payload)
+                    if "id" in payload:
+                        response = {**response, "id": payload["id"]}
                     await websocket.send(json.dumps(response))
                     self._log(
-                        f"[WS] answered page_type={payload.get('page_type')!r}"
+                        f"{tag} answered page_type={payload.get('page_type')!r}"
+                        f" ({'speculative' if hit else 'computed'})"
                     )
+                elif msg_type == "classify":
+                    await self._classify(websocket, session, payload, tag)
                 elif msg_type == "log":
                     self._log(f"[JS] {payload.get('message', '')}")
+                elif msg_type == "fallback":
+                    self._note_fallback(payload, tag)
                 elif msg_type == "debug":
                     page_type = payload.get("page_type") or "unknown"
                     url = payload.get("url", "")
                     btn_groups = payload.get("btn_groups", [])
                     div_groups = payload.get("div_groups", [])
                     btns = payload.get("btns", [])
-                    lines = [f"[DBG] page_type={page_type!r}  {url}"]
+                    detect_ms = payload.get("detect_ms")
+                    lines = [
+                        f"[DBG] page_type={page_type!r}  {url}"
+                        + (f"  (detect {detect_ms} ms)" if detect_ms is not None else "")
+                    ]
                     for i, g in enumerate(btn_groups):
                         lines.append(f"[DBG]   btnGrp[{i}]: {g}")
                     for i, g in enumerate(div_groups):
                         lines.append(f"[DBG]   divGrp[{i}]: {g}")
                     if not btn_groups and not div_groups:
                         lines.append(f"[DBG]   btns: {btns}")
-                    self._log("\n".join(lines))
+                    self._log("\n".join(lines), extra=(
+                        {"detect_ms": detect_ms} if detect_ms is not None else None
+                    ))
+                    self._note_page(session, payload)
                 else:
-                    self._log(f"[WS] unknown message type: {msg_type!r}")
+                    self._log(f"{tag} unknown message type: {str(msg_type)[:40]!r}")
         except websockets.exceptions.ConnectionClosedError:
             pass
         except Exception as exc:  # noqa: BLE001
-            self._log(f"[WS] handler error: {exc}")
+            self._log(f"{tag} handler error: {exc}")
         finally:
-            self._log("[WS] client disconnected")
+            # Speculations survive on the session: the tab reconnects within
+            # seconds and usually asks about the same page.
+            session.connections -= 1
+            session.last_seen = time.monotonic()
+            self._log(f"{tag} client disconnected")
 
     async def start(self) -> None:
         """Bind to a random OS-assigned port and start serving."""
@@ -82,5 +449,8 @@ class WsServer:
         if self._server is not None:
             self._server.close()
             await self._server.wait_closed()
+            for session in self.sessions.values():
+                session.speculation.cancel_all()
+            self.sessions.clear()
             self._log("[WS] server stopped")
             self._server = None
@@ -0,0 +1,115 @@
+"""
+Helpers shared by the benchmark and load-test scripts in tools/: a minimal
+HTTP origin, a plain-HTTP request driver, process peak RSS, waiting for a
+listener and percentiles.
+"""
+from __future__ import annotations
+
+import concurrent.futures
+import http.client
+import http.server
+import socket
+import sys
+import threading
+import time
+
+_BODY = b"x" * 2048
+
+
+class OriginHandler(http.server.BaseHTTPRequestHandler):
+    """Answers every GET with the same 2 KiB body."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY every
+    # response stalls on Nagle + delayed ACK (~40 ms).
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:  # noqa: N802
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(_BODY)))
+        self.end_headers()
+        self.wfile.write(_BODY)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def peak_rss() -> int:
+    """Peak resident set size of this process, in bytes."""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class _PMC(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        pmc = _PMC()
+        pmc.cb = ctypes.sizeof(pmc)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(pmc), pmc.cb)
+        return pmc.PeakWorkingSetSize
+
+    import resource
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def wait_port(port: int, timeout: float = 15.0) -> None:
+    """Block until something accepts connections on 127.0.0.1:*port*."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"listener :{port} did not come up")
+
+
+def drive(ports: list[int], origin: str, requests: int, concurrency: int) -> float:
+    """
+    Send *requests* through every port; return wall time.
+    Each client thread keeps one keep-alive connection per proxy port, the
+    way a webview does.
+    """
+    local = threading.local()
+
+    def one(port: int) -> None:
+        conns = getattr(local, "conns", None)
+        if conns is None:
+            conns = local.conns = {}
+        conn = conns.get(port)
+        if conn is None:
+            conn = conns[port] = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.request("GET", origin)
+        resp = conn.getresponse()
+        resp.read()
+        if resp.status != 200:
+            raise RuntimeError(f"proxy :{port} answered {resp.status}")
+
+    jobs = [port for port in ports for _ in range(requests)]
+    t0 = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, jobs))
+    return time.perf_counter() - t0
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return values[k]
@@ -0,0 +1,188 @@
+"""
+Parity and timing check for server-side page classification.
+
+The reference is inject.js itself: tools/dom_harness.js loads it in node
+over a minimal DOM and reports, for every saved page in tools/fixtures/,
+the page type, each group's pick and element paths as its own finders see
+them, and the snapshot and structure key ``requestPlan`` sends.  This checks that
+page_classifier returns the same page type, paths and picks from that
+snapshot, and the same plan again from the whole saved page.  Option texts
+are printed on a mismatch but not compared.
+
+fixtures/expected.json holds the harness output so the check also runs
+without node; when node is available the live output is used and a stale
+expected.json is reported.  Regenerate it with ``--write-expected`` after
+changing inject.js or the fixtures.
+
+Fixtures that share a structure key must get the same plan, since the
+server answers a known key from its cache.
+
+Timings per fixture snapshot: cold (parse + classify), warm without a key
+(parse + structure_hash + cache hit) and warm with inject.js's structure
+key (cache hit, no parse).  With ``--log`` it also reads a proxy JSON-lines log (see
+log_sink; plain or .gz) and compares the in-webview ``detect_ms`` reported
+in ``debug`` messages with ``snapshot_ms`` / ``classify_ms`` from
+``classify`` messages.
+
+Usage:
+    python tools/classify_parity.py [--iterations 200] [--log path/to/zmd-survey-smasher.jsonl]
+    python tools/classify_parity.py --write-expected
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+_TOOLS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_TOOLS, "..", "src"))
+sys.path.insert(0, _TOOLS)
+
+from page_classifier import PageClassifier, group_texts  # noqa: E402
+from bench_common import percentile  # noqa: E402
+
+_FIXTURES = os.path.join(_TOOLS, "fixtures")
+_EXPECTED = os.path.join(_FIXTURES, "expected.json")
+
+
+def _run_harness() -> dict | None:
+    """inject.js's own results for every fixture, or None without node."""
+    node = shutil.which("node")
+    if node is None:
+        return None
+    pages = sorted(glob.glob(os.path.join(_FIXTURES, "*.html")))
+    out = subprocess.run(
+        [node, os.path.join(_TOOLS, "dom_harness.js"), *pages],
+        check=True, capture_output=True, text=True, encoding="utf-8",
+    )
+    return json.loads(out.stdout)
+
+
+def _plan_of(result: dict) -> dict:
+    return {
+        "page_type": result["page_type"],
+        "groups": [{"paths": g["paths"], "pick": g["pick"]} for g in result["groups"]],
+    }
+
+
+def _check(name: str, js: dict) -> bool:
+    with open(os.path.join(_FIXTURES, name), encoding="utf-8") as f:
+        page = f.read()
+    snap = js["snapshot"]
+    snap_plan, snap_body, _ = PageClassifier().classify(snap)
+    full_plan, _, _ = PageClassifier().classify(page)
+
+    problems = []
+    if snap_plan != _plan_of(js):
+        problems.append(f"inject.js: {json.dumps(_plan_of(js))}")
+        problems.append(f"snapshot:  {json.dumps(snap_plan)}")
+        for group, texts in zip(snap_plan["groups"], group_texts(snap_body, snap_plan)):
+            problems.append(f"    pick {group['pick']} of {json.dumps(texts, ensure_ascii=False)}")
+    if full_plan != snap_plan:
+        problems.append(f"full page: {json.dumps(full_plan)}")
+    status = "ok" if not problems else "MISMATCH"
+    print(f"{name:<24}{status:<10}{snap_plan['page_type']!s:<17}"
+          f"{len(snap_plan['groups'])} group(s), snapshot {len(snap.encode())} B "
+          f"(page {len(page.encode())} B)")
+    for p in problems:
+        print(f"    {p}")
+    return not problems
+
+
+def _time(snap: str, key: str, iterations: int) -> tuple[float, float, float]:
+    def per_call(classifier: PageClassifier | None, client_key: str | None) -> float:
+        t0 = time.perf_counter()
+        for _ in range(iterations):
+            (classifier or PageClassifier()).classify(snap, client_key)
+        return (time.perf_counter() - t0) / iterations * 1000
+
+    cold = per_call(None, None)
+    warm = PageClassifier()
+    warm.classify(snap)
+    keyed = PageClassifier()
+    keyed.classify(snap, key)
+    return cold, per_call(warm, None), per_call(keyed, key)
+
+
+def _log_timings(path: str) -> None:
+    opener = gzip.open if path.endswith(".gz") else open
+    series: dict[str, list[float]] = {"detect_ms": [], "snapshot_ms": [], "classify_ms": []}
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            for key, values in series.items():
+                if isinstance(rec.get(key), (int, float)):
+                    values.append(float(rec[key]))
+    print(f"\nfrom {path}:")
+    print(f"{'':<34}{'count':>7}{'p50 ms':>10}{'p90 ms':>10}{'max ms':>10}")
+    labels = {
+        "detect_ms": "in-webview detection (local)",
+        "snapshot_ms": "in-webview snapshot (server)",
+        "classify_ms": "server classify",
+    }
+    for key, values in series.items():
+        if values:
+            print(f"{labels[key]:<34}{len(values):>7}{percentile(values, 50):>10.2f}"
+                  f"{percentile(values, 90):>10.2f}{max(values):>10.2f}")
+        else:
+            print(f"{labels[key]:<34}{0:>7}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--log", help="proxy JSON-lines log to read client timings from")
+    parser.add_argument("--write-expected", action="store_true",
+                        help="regenerate fixtures/expected.json from inject.js (needs node)")
+    args = parser.parse_args()
+
+    live = _run_harness()
+    if args.write_expected:
+        if live is None:
+            sys.exit("node not found; cannot run tools/dom_harness.js")
+        with open(_EXPECTED, "w", encoding="utf-8") as f:
+            json.dump(live, f, ensure_ascii=False, indent=1)
+            f.write("\n")
+        print(f"wrote {_EXPECTED} ({len(live)} fixture(s))")
+        return
+    with open(_EXPECTED, encoding="utf-8") as f:
+        stored = json.load(f)
+    if live is None:
+        print("node not found; using stored inject.js results from expected.json\n")
+        results = stored
+    else:
+        results = live
+        if live != stored:
+            print("expected.json is stale (inject.js or fixtures changed); "
+                  "rerun with --write-expected\n")
+    ok = all([_check(name, js) for name, js in results.items()])
+    by_key: dict[str, tuple[str, dict]] = {}
+    for name, js in results.items():
+        first = by_key.setdefault(js["structure_key"], (name, _plan_of(js)))
+        if first[1] != _plan_of(js):
+            print(f"structure key collision: {first[0]} and {name} share "
+                  f"{js['structure_key']} but not their plans")
+            ok = False
+
+    print(f"\n{'fixture':<24}{'cold ms':>10}{'warm ms':>10}{'keyed ms':>10}")
+    for name, js in results.items():
+        cold, warm, keyed = _time(js["snapshot"], js["structure_key"], args.iterations)
+        print(f"{name:<24}{cold:>10.3f}{warm:>10.3f}{keyed:>10.3f}")
+
+    if args.log:
+        _log_timings(args.log)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+// dom_harness.js — run inject.js's own page detection over saved pages.
+//
+// Node has no DOM and this repo has no npm dependencies, so this file
+// carries a minimal one: an HTML tokenizer and just enough of
+// Element / Text / querySelectorAll for what inject.js's finders and
+// _snapshot touch.  inject.js is loaded unmodified except for its template
+// placeholders and one line exporting its internal functions.
+//
+// For each fixture prints (as one JSON object keyed by file name) what
+// inject.js detects — page type, per group the pick and the element paths
+// counted over _snapKids — plus the snapshot and structure key requestPlan
+// would send.
+//
+// Usage: node tools/dom_harness.js tools/fixtures/*.html
+'use strict';
+
+var fs = require('fs');
+var path = require('path');
+var vm = require('vm');
+
+var VOID = { area: 1, base: 1, br: 1, col: 1, embed: 1, hr: 1, img: 1, input: 1,
+             link: 1, meta: 1, source: 1, track: 1, wbr: 1 };
+var RAW_TEXT = { script: 1, style: 1 };
+
+// ─── Minimal DOM ───────────────────────────────────────────────────────────
+
+function Text(data) {
+  this.nodeType = 3;
+  this.data = data;
+  this.parentElement = null;
+}
+Object.defineProperty(Text.prototype, 'textContent', {
+  get: function () { return this.data; },
+});
+
+function Element(tag, attrs) {
+  this.nodeType = 1;
+  this.tagName = tag.toUpperCase();
+  this.attrs = attrs;
+  this.childNodes = [];
+  this.parentElement = null;
+  this.id = attrs.id || '';
+  this.className = attrs['class'] || '';
+  // Reflected input state, as the browser would initialise it.
+  this.type = (attrs.type || (tag === 'input' ? 'text' : '')).toLowerCase();
+  this.name = attrs.name || '';
+  this.checked = 'checked' in attrs;
+  this.disabled = 'disabled' in attrs;
+}
+Object.defineProperty(Element.prototype, 'children', {
+  get: function () { return this.childNodes.filter(function (n) { return n.nodeType === 1; }); },
+});
+Object.defineProperty(Element.prototype, 'textContent', {
+  get: function () { return this.childNodes.map(function (n) { return n.textContent; }).join(''); },
+});
+Element.prototype.appendChild = function (node) {
+  node.parentElement = this;
+  this.childNodes.push(node);
+  return node;
+};
+Element.prototype.getAttribute = function (name) {
+  return name in this.attrs ? this.attrs[name] : null;
+};
+Element.prototype.contains = function (node) {
+  for (; node; node = node.parentElement) if (node === this) return true;
+  return false;
+};
+Element.prototype.closest = function (selector) {
+  var test = compile(selector);
+  for (var el = this; el; el = el.parentElement) if (test(el)) return el;
+  return null;
+};
+Element.prototype.querySelectorAll = function (selector) {
+  var test = compile(selector);
+  var out = [];
+  (function walk(el) {
+    el.children.forEach(function (k) {
+      if (test(k)) out.push(k);
+      walk(k);
+    });
+  })(this);
+  return out;
+};
+Element.prototype.querySelector = function (selector) {
+  return this.querySelectorAll(selector)[0] || null;
+};
+Element.prototype.getElementsByTagName = function (tag) {
+  return this.querySelectorAll(tag === '*' ? '*' : tag.toLowerCase());
+};
+
+// Selector subset used by inject.js: "tag", "*", [type="x"] attribute
+// tests, :not([type="x"]) and comma-separated lists.
+function compile(selector) {
+  var alts = selector.split(',').map(function (part) {
+    var m = /^\s*(\*|[a-z]+)((?:\[type="[a-z]+"\]|:not\(\[type="[a-z]+"\]\))*)\s*$/.exec(part);
+    if (!m) throw new Error('dom_harness: unsupported selector ' + JSON.stringify(part));
+    var tag = m[1].toUpperCase();
+    var tests = [];
+    m[2].replace(/(:not\()?\[type="([a-z]+)"\]\)?/g, function (_, not, value) {
+      tests.push({ not: !!not, value: value });
+    });
+    return function (el) {
+      if (tag !== '*' && el.tagName !== tag) return false;
+      return tests.every(function (t) {
+        var v = el.getAttribute('type');
+        var hit = v !== null && v.toLowerCase() === t.value;
+        return t.not ? !hit : hit;
+      });
+    };
+  });
+  return function (el) { return alts.some(function (f) { return f(el); }); };
+}
+
+// ─── HTML tokenizer ────────────────────────────────────────────────────────
+
+function decode(s) {
+  return s.replace(/&(#x[0-9a-f]+|#\d+|amp|lt|gt|quot|apos|nbsp);/gi, function (_, e) {
+    e = e.toLowerCase();
+    if (e[0] === '#') return String.fromCodePoint(e[1] === 'x' ? parseInt(e.slice(2), 16) : +e.slice(1));
+    return { amp: '&', lt: '<', gt: '>', quot: '"', apos: "'", nbsp: ' ' }[e];
+  });
+}
+
+function parseAttrs(s) {
+  var attrs = {};
+  s.replace(/([^\s=\/]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?/g, function (_, k, a, b, c) {
+    attrs[k.toLowerCase()] = decode(a !== undefined ? a : b !== undefined ? b : c !== undefined ? c : '');
+  });
+  return attrs;
+}
+
+function parseHTML(src) {
+  var root = new Element('#document', {});
+  var stack = [root];
+  var re = /<!--[\s\S]*?-->|<![^>]*>|<\/([a-zA-Z][\w-]*)\s*>|<([a-zA-Z][\w-]*)((?:"[^"]*"|'[^']*'|[^'">])*)>/g;
+  var last = 0;
+  var m;
+  function text(s) { if (s) stack[stack.length - 1].appendChild(new Text(decode(s))); }
+  while ((m = re.exec(src))) {
+    text(src.slice(last, m.index));
+    last = re.lastIndex;
+    if (m[1]) {
+      var end = m[1].toLowerCase();
+      for (var i = stack.length - 1; i > 0; i--) {
+        if (stack[i].tagName === end.toUpperCase()) { stack.length = i; break; }
+      }
+    } else if (m[2]) {
+      var tag = m[2].toLowerCase();
+      var rest = m[3];
+      var selfClosing = /\/\s*$/.test(rest);
+      var el = stack[stack.length - 1].appendChild(new Element(tag, parseAttrs(rest.replace(/\/\s*$/, ''))));
+      if (RAW_TEXT[tag]) {
+        var close = src.toLowerCase().indexOf('</' + tag, last);
+        if (close === -1) close = src.length;
+        if (close > last) el.appendChild(new Text(src.slice(last, close)));
+        re.lastIndex = last = src.indexOf('>', close) + 1 || src.length;
+      } else if (!VOID[tag] && !selfClosing) {
+        stack.push(el);
+      }
+    }
+  }
+  text(src.slice(last));
+  return root;
+}
+
+// ─── Load inject.js ────────────────────────────────────────────────────────
+
+var EXPORTS = ['detectPageType', 'getOptionGroups', 'getCheckboxGroups',
+               'pickIndex', '_snapshot', '_snapKids', '_hash53'];
+
+function loadInject(document) {
+  var src = fs.readFileSync(path.join(__dirname, '..', 'src', 'inject.js'), 'utf8')
+    .replace('{{WS_PORT}}', '0')            // no WebSocket
+    .replace('{{SERVER_CLASSIFY}}', 'false');
+  var end = src.lastIndexOf('})();');
+  src = src.slice(0, end) + 'globalThis.__zmd = { ' +
+    EXPORTS.map(function (n) { return n + ': ' + n; }).join(', ') + ' };\n' + src.slice(end);
+  var sandbox = {
+    document: document,
+    window: {},
+    location: { href: 'https://survey.hypergryph.com/' },
+    console: { log: function () {} },
+    MutationObserver: function () { this.observe = function () {}; },
+    setTimeout: function () { return 0; },
+    clearTimeout: function () {},
+    performance: { now: function () { return 0; } },
+  };
+  vm.runInNewContext(src, sandbox, { filename: 'inject.js' });
+  return sandbox.__zmd;
+}
+
+// ─── Main ──────────────────────────────────────────────────────────────────
+
+function detect(file) {
+  var doc = parseHTML(fs.readFileSync(file, 'utf8'));
+  var html = doc.children[0];
+  html.parentElement = null;  // as in a browser: <html> has no parent element
+  // body stays null while inject.js loads, so its overlay UI and bootstrap
+  // stay dormant (readyState 'loading' + no-op addEventListener).
+  var document = {
+    body: null,
+    readyState: 'loading',
+    addEventListener: function () {},
+    querySelectorAll: function (s) { return doc.querySelectorAll(s); },
+    querySelector: function (s) { return doc.querySelector(s); },
+  };
+  var zmd = loadInject(document);
+  document.body = html.querySelector('body');
+
+  function pathOf(el) {
+    var out = [];
+    for (; el !== document.body; el = el.parentElement) {
+      out.unshift(zmd._snapKids(el.parentElement).indexOf(el));
+    }
+    return out;
+  }
+  function label(el) {
+    if (el.tagName === 'INPUT') el = el.closest('label') || el.parentElement;
+    return el.textContent.replace(/\s+/g, ' ').trim().slice(0, 50);
+  }
+
+  var pageType = zmd.detectPageType();
+  var groups = pageType === 'option_groups' ? zmd.getOptionGroups()
+    : pageType === 'checkbox_groups' ? zmd.getCheckboxGroups() : [];
+  var snap = [];
+  var key = { toks: [], names: {}, n: 0 };
+  zmd._snapshot(document.body, snap, key);
+  return {
+    page_type: pageType,
+    groups: groups.map(function (g) {
+      return { pick: zmd.pickIndex(g), paths: g.map(pathOf), texts: g.map(label) };
+    }),
+    snapshot: snap.join(''),
+    structure_key: zmd._hash53(key.toks.join('')),
+  };
+}
+
+var out = {};
+process.argv.slice(2).forEach(function (file) { out[path.basename(file)] = detect(file); });
+process.stdout.write(JSON.stringify(out, null, 1) + '\n');
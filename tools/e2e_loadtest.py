@@ -0,0 +1,464 @@
+"""
+End-to-end proxy load test against a local stand-in survey origin.
+
+Exercises the whole path offline:
+
+    HTTP client ──CONNECT──► ProxyManager (mitmproxy + SurveyAddon)
+                 ──TLS──► local HTTPS origin (survey.hypergryph.com,
+                                               noise.game.invalid)
+    client ──WS──► WsServer, using the port baked into the injected page
+
+The origin serves the saved pages in tools/fixtures/ in br / gzip /
+identity (per Accept-Encoding), a hashed SPA bundle, a hashed CJK font
+larger than mitmproxy's usual streaming threshold, small "game noise"
+API calls and large downloads.  Client threads keep TLS connections open
+through the proxy, trust the run's fresh mitmproxy CA, check that every
+survey page came back with the inline script, and then talk to the WS
+server like inject.js does (debug → query → eval).
+
+Reports throughput, latency percentiles per flow class and the proxy
+process's peak RSS / CPU per flow.  The proxy runs in a child process
+(``--worker``) so its numbers are not mixed with the origin and clients.
+The Windows system-proxy step is not part of the rig — clients are
+pointed at the proxy explicitly, so it runs on Linux.
+
+Usage:
+    python tools/e2e_loadtest.py --clients 32 --duration 20
+"""
+from __future__ import annotations
+
+import argparse
+import collections
+import contextlib
+import gzip
+import hashlib
+import http.client
+import http.server
+import json
+import os
+import random
+import re
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+_TOOLS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(_TOOLS, "..", "src"))
+
+import brotli  # noqa: E402  (mitmproxy dependency)
+from cryptography import x509  # noqa: E402
+from cryptography.hazmat.primitives import serialization  # noqa: E402
+from mitmproxy.certs import CertStore  # noqa: E402
+from websockets.sync.client import connect as ws_connect  # noqa: E402
+
+from bench_common import peak_rss, percentile, wait_port  # noqa: E402
+from port_utils import find_free_port  # noqa: E402
+
+SURVEY_HOST = "survey.hypergryph.com"
+NOISE_HOST = "noise.game.invalid"
+_FIXTURES = os.path.join(_TOOLS, "fixtures")
+_ASSET_PATH = "/assets/index.3f9a1c2b.js"
+_FONT_PATH = "/assets/HarmonyOS_Sans_SC.9c2e41d7.woff2"
+_WS_PORT_RE = re.compile(rb"var WS_PORT = (\d+);")
+
+
+# ──────────────────────────────────────────────────────────────────────
+# Stand-in origin
+# ──────────────────────────────────────────────────────────────────────
+
+
+def _encode(body: bytes) -> dict[str, bytes]:
+    return {
+        "br": brotli.compress(body),
+        "gzip": gzip.compress(body),
+        "identity": body,
+    }
+
+
+class _Origin:
+    def __init__(self, download_bytes: int, font_bytes: int) -> None:
+        self.pages = {}
+        for name in sorted(os.listdir(_FIXTURES)):
+            if name.endswith(".html"):
+                with open(os.path.join(_FIXTURES, name), "rb") as f:
+                    self.pages[name[:-5]] = _encode(f.read())
+        rng = random.Random(0)
+        bundle = "".join(
+            f"function f{i}(a){{return a*{rng.randint(1, 999)}+{i};}}\n" for i in range(6000)
+        ).encode()
+        self.asset = _encode(bundle)
+        self.asset_etag = '"' + hashlib.sha1(bundle).hexdigest()[:16] + '"'
+        # woff2 is already compressed; served as identity only.
+        self.font = rng.randbytes(font_bytes)
+        self.download = os.urandom(64 * 1024)
+        self.download_bytes = download_bytes
+        self.hits: collections.Counter[str] = collections.Counter()
+        self._lock = threading.Lock()
+
+    def count(self, kind: str) -> None:
+        with self._lock:
+            self.hits[kind] += 1
+
+
+def _make_handler(origin: _Origin):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def _send(self, status: int, body: bytes, headers: dict[str, str]) -> None:
+            self.send_response(status)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _pick_encoding(self) -> str:
+            accept = self.headers.get("Accept-Encoding", "")
+            for enc in ("br", "gzip"):
+                if enc in accept:
+                    return enc
+            return "identity"
+
+        def do_GET(self) -> None:  # noqa: N802
+            host = (self.headers.get("Host") or "").split(":")[0]
+            path = self.path.split("?", 1)[0]
+            if host == SURVEY_HOST and path == _ASSET_PATH:
+                origin.count("survey_asset")
+                enc = self._pick_encoding()
+                headers = {
+                    "Content-Type": "application/javascript",
+                    "Cache-Control": "public, max-age=31536000, immutable",
+                    "ETag": origin.asset_etag,
+                }
+                if enc != "identity":
+                    headers["Content-Encoding"] = enc
+                self._send(200, origin.asset[enc], headers)
+            elif host == SURVEY_HOST and path == _FONT_PATH:
+                origin.count("survey_font")
+                self._send(200, origin.font, {
+                    "Content-Type": "font/woff2",
+                    "Cache-Control": "public, max-age=31536000, immutable",
+                })
+            elif host == SURVEY_HOST and path.startswith("/page/"):
+                origin.count("survey_html")
+                page = origin.pages.get(path[len("/page/"):])
+                if page is None:
+                    self._send(404, b"not found", {"Content-Type": "text/plain"})
+                    return
+                enc = self._pick_encoding()
+                headers = {"Content-Type": "text/html; charset=utf-8"}
+                if enc != "identity":
+                    headers["Content-Encoding"] = enc
+                self._send(200, page[enc], headers)
+            elif host == NOISE_HOST and path.startswith("/download/"):
+                origin.count("noise_download")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(origin.download_bytes))
+                self.end_headers()
+                left = origin.download_bytes
+                while left > 0:
+                    chunk = origin.download[: min(left, len(origin.download))]
+                    self.wfile.write(chunk)
+                    left -= len(chunk)
+            elif host == NOISE_HOST:
+                origin.count("noise_api")
+                body = json.dumps({"ok": True, "ts": time.time(), "path": path}).encode()
+                self._send(200, body, {"Content-Type": "application/json"})
+            else:
+                self._send(404, b"unknown host", {"Content-Type": "text/plain"})
+
+        def log_message(self, *args) -> None:
+            pass
+
+    return Handler
+
+
+def _origin_tls_context(workdir: str) -> ssl.SSLContext:
+    """Self-signed cert for both stand-in hosts, from a throwaway CA."""
+    store = CertStore.from_store(os.path.join(workdir, "origin-ca"), "origin", 2048)
+    entry = store.get_cert(SURVEY_HOST, [x509.DNSName(SURVEY_HOST), x509.DNSName(NOISE_HOST)])
+    pem = os.path.join(workdir, "origin.pem")
+    with open(pem, "wb") as f:
+        f.write(entry.cert.to_pem())
+        f.write(entry.privatekey.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption(),
+        ))
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ctx.load_cert_chain(pem)
+    return ctx
+
+
+# ──────────────────────────────────────────────────────────────────────
+# Proxy worker (child process)
+# ──────────────────────────────────────────────────────────────────────
+
+
+class _RedirectUpstream:
+    """mitmproxy addon: send every upstream connection to the local origin."""
+
+    def __init__(self, port: int) -> None:
+        self.port = port
+
+    def server_connect(self, data) -> None:
+        data.server.address = ("127.0.0.1", self.port)
+
+
+def _worker(proxy_port: int, origin_port: int, workdir: str, log_dir: str) -> None:
+    from log_sink import start_log_sink
+    from proxy_manager import ProxyManager
+
+    # Same sink as the GUI (minus the window), so its cost is in the numbers.
+    log_sink = start_log_sink(log_dir=log_dir)
+
+    manager = ProxyManager(
+        cache_dir=os.path.join(workdir, "asset-cache"),
+        extra_addons=[_RedirectUpstream(origin_port)],
+        mitm_options={
+            "confdir": os.path.join(workdir, "mitmproxy"),
+            "ssl_insecure": True,  # the stand-in origin's cert is self-signed
+        },
+    )
+    manager.start(proxy_port=proxy_port)
+    wait_port(proxy_port)
+    cpu0 = time.process_time()
+    print("ready", flush=True)
+    sys.stdin.readline()
+    stats = {"cpu": time.process_time() - cpu0, "rss": peak_rss()}
+    manager.stop()
+    log_sink.stop()
+    print(json.dumps(stats), flush=True)
+
+
+# ──────────────────────────────────────────────────────────────────────
+# Client
+# ──────────────────────────────────────────────────────────────────────
+
+
+def _decode(body: bytes, encoding: str | None) -> bytes:
+    if encoding == "br":
+        return brotli.decompress(body)
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    return body
+
+
+class _Client(threading.Thread):
+    # (flow class, weight)
+    MIX = [("survey_html", 25), ("survey_asset", 12), ("survey_font", 3), ("noise_api", 55),
+           ("noise_download", 5)]
+    ENCODINGS = ["br, gzip", "gzip", "identity"]
+
+    def __init__(self, idx: int, proxy_port: int, ca_file: str, pages: list[str],
+                 deadline: float, results: dict, errors: list) -> None:
+        super().__init__(daemon=True)
+        self.idx = idx
+        self.proxy_port = proxy_port
+        self.pages = pages
+        self.deadline = deadline
+        self.results = results
+        self.errors = errors
+        self.bytes = 0
+        self.injected = 0
+        self.rng = random.Random(idx)
+        self.ctx = ssl.create_default_context(cafile=ca_file)
+        self.conns: dict[str, http.client.HTTPSConnection] = {}
+        self.ws = None
+        self._stack = contextlib.ExitStack()
+
+    def _conn(self, host: str) -> http.client.HTTPSConnection:
+        conn = self.conns.get(host)
+        if conn is None:
+            conn = http.client.HTTPSConnection(
+                "127.0.0.1", self.proxy_port, context=self.ctx, timeout=30
+            )
+            conn.set_tunnel(host, 443)
+            self.conns[host] = conn
+        return conn
+
+    def _get(self, host: str, path: str, headers: dict[str, str]) -> http.client.HTTPResponse:
+        try:
+            conn = self._conn(host)
+            conn.request("GET", path, headers=headers)
+            return conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            # Keep-alive connection dropped; retry once on a fresh one.
+            self.conns.pop(host, None)
+            conn = self._conn(host)
+            conn.request("GET", path, headers=headers)
+            return conn.getresponse()
+
+    def _ws_roundtrip(self, ws_port: int, page: str) -> None:
+        if self.ws is None:
+            self.ws = self._stack.enter_context(
+                ws_connect(f"ws://127.0.0.1:{ws_port}/?sid=e2e-{self.idx}&speculate=1")
+            )
+        key = f"e2e-{self.idx}|{page}|{time.monotonic()}"
+        base = {"url": f"https://{SURVEY_HOST}/page/{page}", "page_key": key, "page_type": page}
+        t0 = time.perf_counter()
+        self.ws.send(json.dumps({"type": "debug", "btn_groups": [], "div_groups": [], **base}))
+        self.ws.send(json.dumps({"type": "query", **base}))
+        reply = json.loads(self.ws.recv(timeout=10))
+        self.results["ws_query"].append(time.perf_counter() - t0)
+        if reply.get("type") != "eval":
+            raise RuntimeError(f"unexpected WS reply {reply!r}")
+
+    def _one(self, kind: str) -> None:
+        if kind == "survey_html":
+            page = self.rng.choice(self.pages)
+            ae = self.rng.choice(self.ENCODINGS)
+            t0 = time.perf_counter()
+            resp = self._get(SURVEY_HOST, f"/page/{page}", {"Accept-Encoding": ae})
+            body = resp.read()
+            self.results[kind].append(time.perf_counter() - t0)
+            html = _decode(body, resp.getheader("Content-Encoding"))
+            m = _WS_PORT_RE.search(html)
+            if resp.status != 200 or m is None:
+                raise RuntimeError(f"survey page {page} ({ae}) not injected")
+            self.injected += 1
+            self._ws_roundtrip(int(m.group(1)), page)
+        elif kind == "survey_asset":
+            t0 = time.perf_counter()
+            resp = self._get(SURVEY_HOST, _ASSET_PATH, {"Accept-Encoding": "br, gzip"})
+            body = resp.read()
+            self.results[kind].append(time.perf_counter() - t0)
+        elif kind == "survey_font":
+            t0 = time.perf_counter()
+            resp = self._get(SURVEY_HOST, _FONT_PATH, {"Accept-Encoding": "br, gzip"})
+            body = resp.read()
+            self.results[kind].append(time.perf_counter() - t0)
+        elif kind == "noise_api":
+            t0 = time.perf_counter()
+            resp = self._get(NOISE_HOST, f"/api/ping?i={self.rng.random()}", {})
+            body = resp.read()
+            self.results[kind].append(time.perf_counter() - t0)
+        else:
+            t0 = time.perf_counter()
+            resp = self._get(NOISE_HOST, "/download/pack.bin", {})
+            body = resp.read()
+            self.results[kind].append(time.perf_counter() - t0)
+        if resp.status != 200:
+            raise RuntimeError(f"{kind}: HTTP {resp.status}")
+        self.bytes += len(body)
+
+    def run(self) -> None:
+        kinds = [k for k, _ in self.MIX]
+        weights = [w for _, w in self.MIX]
+        while time.monotonic() < self.deadline:
+            kind = self.rng.choices(kinds, weights)[0]
+            try:
+                self._one(kind)
+            except Exception as exc:  # noqa: BLE001
+                self.errors.append(f"client {self.idx} {kind}: {exc!r}")
+                self.conns.pop(SURVEY_HOST, None)
+                self.conns.pop(NOISE_HOST, None)
+        for conn in self.conns.values():
+            conn.close()
+        self._stack.close()
+
+
+# ──────────────────────────────────────────────────────────────────────
+# Driver
+# ──────────────────────────────────────────────────────────────────────
+
+
+def _run(args: argparse.Namespace) -> None:
+    workdir = tempfile.mkdtemp(prefix="zmd-e2e-")
+    try:
+        origin = _Origin(args.download_mb * 2**20, args.font_kb * 1024)
+        origin_srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(origin))
+        origin_srv.daemon_threads = True
+        origin_srv.socket = _origin_tls_context(workdir).wrap_socket(
+            origin_srv.socket, server_side=True, do_handshake_on_connect=False
+        )
+        threading.Thread(target=origin_srv.serve_forever, daemon=True).start()
+
+        proxy_port = find_free_port(20000, 60000)
+        proc = subprocess.Popen(
+            [sys.executable, __file__, "--worker", str(proxy_port),
+             str(origin_srv.server_port), workdir,
+             args.log_dir or os.path.join(workdir, "logs")],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        assert proc.stdin is not None and proc.stdout is not None
+        if proc.stdout.readline().strip() != "ready":
+            proc.kill()
+            raise RuntimeError("proxy worker failed to start")
+        ca_file = os.path.join(workdir, "mitmproxy", "mitmproxy-ca-cert.pem")
+
+        results: dict[str, list[float]] = collections.defaultdict(list)
+        errors: list[str] = []
+        t0 = time.monotonic()
+        clients = [
+            _Client(i, proxy_port, ca_file, sorted(origin.pages), t0 + args.duration,
+                    results, errors)
+            for i in range(args.clients)
+        ]
+        for c in clients:
+            c.start()
+        for c in clients:
+            c.join()
+        elapsed = time.monotonic() - t0
+
+        proc.stdin.write("report\n")
+        proc.stdin.flush()
+        proxy = json.loads(proc.stdout.readline())
+        proc.wait(timeout=15)
+        origin_srv.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    flows = sum(len(v) for k, v in results.items() if k != "ws_query")
+    total_bytes = sum(c.bytes for c in clients)
+    injected = sum(c.injected for c in clients)
+    print(f"clients {args.clients}, {elapsed:.1f}s: {flows} flows, "
+          f"{flows / elapsed:,.0f} req/s, {total_bytes / elapsed / 2**20:,.1f} MiB/s")
+    print(f"{'class':<15}{'count':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for kind in ("survey_html", "survey_asset", "survey_font", "noise_api", "noise_download",
+                 "ws_query"):
+        ms = [x * 1000 for x in results.get(kind, [])]
+        if not ms:
+            continue
+        print(f"{kind:<15}{len(ms):>7}{percentile(ms, 50):>10.1f}{percentile(ms, 90):>10.1f}"
+              f"{percentile(ms, 99):>10.1f}{max(ms):>10.1f}")
+    print(f"survey pages injected: {injected}/{len(results.get('survey_html', []))}; "
+          f"asset requests reaching origin: {origin.hits['survey_asset']}"
+          f"/{len(results.get('survey_asset', []))} bundle, {origin.hits['survey_font']}"
+          f"/{len(results.get('survey_font', []))} font")
+    print(f"proxy process: peak RSS {proxy['rss'] / 2**20:.1f} MiB, "
+          f"CPU {proxy['cpu']:.2f}s ({proxy['cpu'] / max(flows, 1) * 1000:.2f} ms/flow)")
+    if args.log_dir:
+        print(f"proxy log: {os.path.join(args.log_dir, 'zmd-survey-smasher.jsonl')}")
+    if errors:
+        print(f"errors: {len(errors)}, first: {errors[0]}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--download-mb", type=int, default=8,
+                        help="size of each large 'game noise' download")
+    parser.add_argument("--font-kb", type=int, default=1536,
+                        help="size of the hashed survey font (above 512 KiB to catch streaming)")
+    parser.add_argument("--log-dir",
+                        help="keep the proxy's JSON-lines log here (default: discarded)")
+    parser.add_argument("--worker", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        proxy_port, origin_port, workdir, log_dir = args.worker
+        _worker(int(proxy_port), int(origin_port), workdir, log_dir)
+        return
+    _run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Compare one ProxyManager with N listeners against N single-listener processes.
+
+Both layouts run as child processes (``--worker``) so they are measured the
+same way.  The parent starts a local HTTP origin, brings up the workers,
+pushes ``--requests`` plain-HTTP requests through every listener and then
+asks each worker for its peak RSS and CPU time.
+
+Usage:
+    python tools/listeners_bench.py --listeners 4 --requests 200
+"""
+from __future__ import annotations
+
+import argparse
+import http.server
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+_SRC = os.path.join(os.path.dirname(__file__), "..", "src")
+sys.path.insert(0, _SRC)
+
+from bench_common import OriginHandler, drive, peak_rss, wait_port  # noqa: E402
+from port_utils import find_free_port  # noqa: E402
+
+def _worker(ports: list[int]) -> None:
+    """Run one ProxyManager serving *ports*; report stats once stdin gets a line."""
+    from proxy_manager import ProxyManager
+
+    # Throwaway asset cache: keep benchmark runs out of the user's real one.
+    cache_dir = tempfile.TemporaryDirectory(prefix="zmd-bench-")
+    manager = ProxyManager(cache_dir=cache_dir.name)
+    manager.start(proxy_port=ports[0], extra_ports=ports[1:])
+    for port in ports:
+        wait_port(port)
+    print("ready", flush=True)
+    sys.stdin.readline()
+    stats = {"rss": peak_rss(), "cpu": time.process_time()}
+    manager.stop()
+    cache_dir.cleanup()
+    print(json.dumps(stats), flush=True)
+
+
+def _spawn(ports: list[int]) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, __file__, "--worker", *map(str, ports)],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    assert proc.stdout is not None
+    line = proc.stdout.readline().strip()
+    if line != "ready":
+        proc.kill()
+        raise RuntimeError(f"worker for {ports} failed to start: {line!r}")
+    return proc
+
+
+def _collect(procs: list[subprocess.Popen]) -> tuple[int, float]:
+    rss = 0
+    cpu = 0.0
+    for proc in procs:
+        assert proc.stdin is not None and proc.stdout is not None
+        proc.stdin.write("report\n")
+        proc.stdin.flush()
+        stats = json.loads(proc.stdout.readline())
+        proc.wait(timeout=15)
+        rss += stats["rss"]
+        cpu += stats["cpu"]
+    return rss, cpu
+
+
+def _run_layout(name: str, groups: list[list[int]], origin: str, args) -> None:
+    t0 = time.perf_counter()
+    procs = [_spawn(ports) for ports in groups]
+    startup = time.perf_counter() - t0
+    ports = [p for g in groups for p in g]
+    wall = drive(ports, origin, args.requests, args.concurrency)
+    rss, cpu = _collect(procs)
+    flows = len(ports) * args.requests
+    print(
+        f"{name:<22} procs={len(procs):<3} startup {startup:6.2f}s  "
+        f"peak RSS {rss / 2**20:8.1f} MiB  CPU {cpu:6.2f}s  "
+        f"({cpu / flows * 1000:.2f} ms/flow, {flows / wall:,.0f} req/s)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--listeners", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200,
+                        help="requests per listener")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--worker", type=int, nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args.worker)
+        return
+
+    origin_srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), OriginHandler)
+    threading.Thread(target=origin_srv.serve_forever, daemon=True).start()
+    origin = f"http://127.0.0.1:{origin_srv.server_port}/blob"
+
+    def fresh_ports() -> list[int]:
+        ports: list[int] = []
+        while len(ports) < args.listeners:
+            port = find_free_port(20000, 60000)
+            if port not in ports:
+                ports.append(port)
+        return ports
+
+    _run_layout("1 process, N listeners", [fresh_ports()], origin, args)
+    _run_layout("N processes", [[p] for p in fresh_ports()], origin, args)
+    origin_srv.shutdown()
+
+
+if __name__ == "__main__":
+    main()
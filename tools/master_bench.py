@@ -0,0 +1,97 @@
+"""
+Throughput comparison: LeanMaster vs mitmproxy's DumpMaster.
+
+Each variant runs in its own child process (``ProxyManager(lean=...)``).
+The parent starts a local HTTP origin, pushes ``--requests`` requests
+through the proxy and reports requests/sec plus proxy CPU per flow (CPU
+time the proxy process spent between "ready" and the end of the run).
+
+Usage:
+    python tools/master_bench.py --requests 2000 --concurrency 16
+"""
+from __future__ import annotations
+
+import argparse
+import http.server
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+_SRC = os.path.join(os.path.dirname(__file__), "..", "src")
+sys.path.insert(0, _SRC)
+
+from bench_common import OriginHandler, drive, peak_rss, wait_port  # noqa: E402
+from port_utils import find_free_port  # noqa: E402
+
+
+def _worker(port: int, lean: bool) -> None:
+    from proxy_manager import ProxyManager
+
+    # Throwaway asset cache: keep benchmark runs out of the user's real one.
+    cache_dir = tempfile.TemporaryDirectory(prefix="zmd-bench-")
+    manager = ProxyManager(lean=lean, cache_dir=cache_dir.name)
+    manager.start(proxy_port=port)
+    wait_port(port)
+    cpu0 = time.process_time()
+    print("ready", flush=True)
+    sys.stdin.readline()
+    stats = {"cpu": time.process_time() - cpu0, "rss": peak_rss()}
+    manager.stop()
+    cache_dir.cleanup()
+    print(json.dumps(stats), flush=True)
+
+
+def _run_variant(name: str, lean: bool, origin: str, args) -> None:
+    port = find_free_port(20000, 60000)
+    cmd = [sys.executable, __file__, "--worker", str(port)]
+    if not lean:
+        cmd.append("--dump-master")
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    assert proc.stdin is not None and proc.stdout is not None
+    if proc.stdout.readline().strip() != "ready":
+        proc.kill()
+        raise RuntimeError(f"{name} worker failed to start")
+
+    drive([port], origin, args.warmup, args.concurrency)
+    wall = drive([port], origin, args.requests, args.concurrency)
+
+    proc.stdin.write("report\n")
+    proc.stdin.flush()
+    stats = json.loads(proc.stdout.readline())
+    proc.wait(timeout=15)
+    flows = args.warmup + args.requests
+    print(
+        f"{name:<11} {args.requests / wall:8,.0f} req/s   "
+        f"CPU {stats['cpu'] / flows * 1000:6.3f} ms/flow   "
+        f"peak RSS {stats['rss'] / 2**20:6.1f} MiB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--dump-master", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args.worker, lean=not args.dump_master)
+        return
+
+    origin_srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), OriginHandler)
+    threading.Thread(target=origin_srv.serve_forever, daemon=True).start()
+    origin = f"http://127.0.0.1:{origin_srv.server_port}/blob"
+
+    _run_variant("DumpMaster", False, origin, args)
+    _run_variant("LeanMaster", True, origin, args)
+    origin_srv.shutdown()
+
+
+if __name__ == "__main__":
+    main()
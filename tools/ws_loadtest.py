@@ -0,0 +1,191 @@
+"""
+Load test for WsServer: simulates many concurrent inject.js clients.
+
+Each simulated tab connects with its own ``?sid=`` (opting in to
+speculative answers with ``speculate=1``), replays a small queue of ``log``
+messages (like inject.js after a reconnect), then walks through pages
+sending ``debug`` → ``query`` and waiting for the ``eval`` answer.
+
+Reports server throughput, query latency percentiles and server-side
+memory per session (tracemalloc, allocations in ws_server / websockets
+server code only — client-side allocations are excluded).  Clients and
+server share one process, so throughput is a lower bound once the CPU
+saturates.
+
+Usage:
+    python tools/ws_loadtest.py --clients 300 --duration 10
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import websockets  # noqa: E402
+
+from bench_common import percentile  # noqa: E402
+from strategy import AnswerStrategy  # noqa: E402
+from ws_server import WsServer  # noqa: E402
+
+_QUERY_TIMEOUT = 2.0
+
+_PAGE_TYPES = ["agreement", "option_groups", "option_groups", "checkbox_groups"]
+
+_SERVER_FILTERS = [
+    tracemalloc.Filter(True, "*ws_server.py"),
+    tracemalloc.Filter(True, "*websockets*server.py"),
+    tracemalloc.Filter(True, "*websockets*protocol.py"),
+]
+
+
+def _traced_server_bytes() -> int:
+    snap = tracemalloc.take_snapshot().filter_traces(_SERVER_FILTERS)
+    return sum(s.size for s in snap.statistics("filename"))
+
+
+async def _client(
+    idx: int,
+    port: int,
+    deadline: float,
+    page_interval: float,
+    latencies: list[float],
+    errors: list[str],
+    outcomes: collections.Counter[str],
+) -> int:
+    """
+    Run one simulated tab until *deadline*; returns messages sent.  Each
+    query carries an id and only the reply with that id ends the wait, so a
+    late reply to an earlier query is never mistaken for the current one.
+    """
+    sent = 0
+    uri = f"ws://127.0.0.1:{port}/?sid=load-{idx:05d}&speculate=1"
+    try:
+        async with websockets.connect(uri, max_queue=None) as ws:
+            # Queue replay on (re)connect
+            for i in range(20):
+                await ws.send(json.dumps({"type": "log", "message": f"replay {i}"}))
+                sent += 1
+            page = 0
+            while time.monotonic() < deadline:
+                qid = page + 1
+                page_type = _PAGE_TYPES[page % len(_PAGE_TYPES)]
+                base = {
+                    "url": f"https://survey.hypergryph.com/load/{idx}",
+                    "page_key": f"load-{idx}|{page}",
+                    "page_type": page_type,
+                }
+                await ws.send(json.dumps({
+                    "type": "debug", "btns": [], "btn_groups": [["a", "b", "c"]],
+                    "div_groups": [], **base,
+                }))
+                await ws.send(json.dumps({"type": "log", "message": f"→ {page_type}"}))
+                t0 = time.perf_counter()
+                await ws.send(json.dumps({"type": "query", "id": qid, **base}))
+                sent += 3
+                page += 1
+                try:
+                    async with asyncio.timeout(_QUERY_TIMEOUT):
+                        reply = json.loads(await ws.recv())
+                        while reply.get("id") != qid:
+                            outcomes["late"] += 1
+                            reply = json.loads(await ws.recv())
+                except TimeoutError:
+                    outcomes["unanswered"] += 1
+                    continue
+                if reply.get("error"):
+                    # With --rate-limit: the server dropped the query and said so.
+                    outcomes["rejected"] += 1
+                elif reply.get("type") != "eval":
+                    errors.append(f"client {idx}: unexpected reply {reply!r}")
+                else:
+                    outcomes["answered"] += 1
+                    latencies.append(time.perf_counter() - t0)
+                await asyncio.sleep(page_interval)
+    except Exception as exc:  # noqa: BLE001
+        errors.append(f"client {idx}: {exc!r}")
+    return sent
+
+
+async def _run(args: argparse.Namespace) -> None:
+    if args.memory:
+        tracemalloc.start()
+    server = WsServer(AnswerStrategy())
+    # Loosen the per-session limit unless testing it explicitly.
+    if not args.rate_limit:
+        server.RATE_LIMIT = 1e9
+        server.RATE_BURST = 10**9
+    await server.start()
+    base_mem = _traced_server_bytes() if args.memory else 0
+
+    latencies: list[float] = []
+    errors: list[str] = []
+    outcomes: collections.Counter[str] = collections.Counter()
+    cpu0 = time.process_time()
+    t0 = time.monotonic()
+    deadline = t0 + args.duration
+    clients = [
+        asyncio.create_task(_client(i, server.port, deadline, args.interval,
+                                    latencies, errors, outcomes))
+        for i in range(args.clients)
+    ]
+
+    # Sample server-side memory mid-run, while every session is connected.
+    await asyncio.sleep(min(args.duration / 2, 5.0))
+    live_mem = _traced_server_bytes() if args.memory else 0
+    live_sessions = server.stats()["sessions"]
+
+    sent = sum(await asyncio.gather(*clients))
+    elapsed = time.monotonic() - t0
+    cpu = time.process_time() - cpu0
+    stats = server.stats()
+    await server.stop()
+    if args.memory:
+        tracemalloc.stop()
+
+    received = sum(stats["counters"].values())
+    print(f"clients          : {args.clients}  duration {elapsed:.1f}s")
+    print(f"sessions         : {stats['sessions']}  (live at sample: {live_sessions})")
+    print(f"messages         : sent {sent}, handled {received}, dropped {stats['dropped']}")
+    print(f"queries          : answered {outcomes['answered']}, "
+          f"rejected {outcomes['rejected']}, unanswered {outcomes['unanswered']}, "
+          f"late replies {outcomes['late']}")
+    print(f"throughput       : {received / elapsed:,.0f} msg/s, "
+          f"{len(latencies) / elapsed:,.0f} query/s")
+    if latencies:
+        ms = [x * 1000 for x in latencies]
+        print(f"query latency ms : p50 {percentile(ms, 50):.2f}  p90 {percentile(ms, 90):.2f}  "
+              f"p99 {percentile(ms, 99):.2f}  max {max(ms):.2f}  mean {statistics.fmean(ms):.2f}")
+    if args.memory and live_sessions:
+        per = (live_mem - base_mem) / live_sessions
+        print(f"server memory    : {live_mem / 1024:,.0f} KiB traced, ~{per / 1024:.1f} KiB/session")
+    print(f"process CPU      : {cpu:.2f}s (clients + server share this process)")
+    if errors:
+        print(f"errors           : {len(errors)}, first: {errors[0]}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--interval", type=float, default=0.5,
+                        help="pause between pages per client, seconds")
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="keep WsServer's default per-session rate limit")
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="skip tracemalloc (it slows the run noticeably)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()